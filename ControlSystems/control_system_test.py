@@ -9,19 +9,29 @@ import RPi.GPIO as rpi_GPIO
 import Adafruit_GPIO as GPIO
 import Adafruit_GPIO.PWM as PWM
 from Adafruit_BNO055 import BNO055
+from Adafruit_BNO055 import sampler
 
 # pin decs
 IMU_LED = 6 #BCM
 IMU_Button = 5 #BCM
-
-def readFromIMU(bno):    #, buffer, bufferIndex):
-    gx, gy, gz = bno.read_gyroscope()
-    # Linear acceleration data (i.e. acceleration from movement, not gravity--
-    # returned in meters per second squared):
-    ax, ay, az = bno.read_linear_acceleration()
-    # Orientation as a quaternion:
-    dx, dy, dz, w = bno.read_quaternion()
-    return (gx, gy, gz, ax, ay, az, dx, dy, dz, w)
+RELAY_1 = 12
+RELAY_2 = 18
+
+# Wait for the next sample from the sampler and return it, along with the
+# new position in its ring buffer
+def readFromIMU(imuSampler, position):
+    position = imuSampler.wait(position)
+    (tstamp, gx, gy, gz, ax, ay, az,
+     dx, dy, dz, w, temp_c) = imuSampler.buffer.latest()
+    return (position, (gx, gy, gz, ax, ay, az, dx, dy, dz, w))
+
+# Turn both relays off, e.g. when the IMU stops giving samples
+def stopRelays(pwm):
+    for relay in (RELAY_1, RELAY_2):
+        try:
+            pwm.stop(relay)
+        except ValueError:
+            pass # never started
 
 # init
 def init(bno, gpio):
@@ -89,17 +99,23 @@ if __name__ == '__main__':     # Program start from here
     try:
         try:
             bno = None
+            pwm = None
             gpio = GPIO.get_platform_gpio(mode=rpi_GPIO.BCM)
             pwm = PWM.get_platform_pwm()
             (bno, gpio) = init(bno, gpio)
 
             dt = 0.1
             f = 1/dt 
+
+            # the sampler paces the control loop at its fixed sample rate
+            imuSampler = sampler.Sampler(bno, rate=100)
+            imuSampler.start()
+            position = 0
                         
             # set up the relays
-            relay1 = 12
+            relay1 = RELAY_1
             pwm.start(relay1, 0, f)
-            relay2 = 18
+            relay2 = RELAY_2
             pwm.start(relay2, 0, f)
 
             #init control gains
@@ -117,7 +133,8 @@ if __name__ == '__main__':     # Program start from here
 
             while True: 
                 #Get the current position   
-                gx, gy, gz, ax, ay, az, dx, dy, dz, w = readFromIMU(bno)
+                (position, (gx, gy, gz, ax, ay, az,
+                             dx, dy, dz, w)) = readFromIMU(imuSampler, position)
                 #Calculate the error 
                 feedback_value = yawFromQuatenion(w, dx, dy, dz)
                 error = set_point - feedback_value #or current_position
@@ -157,6 +174,10 @@ if __name__ == '__main__':     # Program start from here
                     pwm.set_duty_cycle(relay2, 0)
             
         except Exception as e:
+            # readFromIMU raises if the sampler fails, don't leave the
+            # relays driving
             print(e)
+            if pwm is not None:
+                stopRelays(pwm)
     except KeyboardInterrupt:  # When 'Ctrl+C' is pressed, the child program destroy() will be executed
         exit()
\ No newline at end of file
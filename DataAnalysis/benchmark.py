@@ -0,0 +1,70 @@
+import sys
+import time
+import numpy as np
+import imu_log_tools as imu
+import quaternion_conversions as quat_conv
+
+# Timing harness for the analysis tools. Run from this directory with an IMU
+# log, e.g.
+#   python benchmark.py flight_data/f_imu_slice_over_30k.csv
+
+def timeCall(function, *args, repeats=5):
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return (best, result)
+
+def report(name, scalar_time, batch_time, samples):
+    print("{0}: scalar {1:.4f} s, batch {2:.4f} s, {3:.1f}x "
+          "({4} samples)".format(name, scalar_time, batch_time,
+                                 scalar_time / batch_time, samples))
+
+def benchmarkQuaternionConversions(filename):
+    with open(filename) as file:
+        (total_lines, indices, timestamps, gyro_data,
+         acc_data, quaternions, temperatures) = imu.parseFile(file)
+    quaternion_array = np.array(quaternions)
+
+    (scalar_time, scalar) = timeCall(quat_conv.calculateEulerAngles,
+                                     quaternions)
+    (batch_time, batch) = timeCall(quat_conv.quaternionsToEulerAngles,
+                                   quaternion_array)
+    assert np.allclose(scalar, batch)
+    report("Euler angles", scalar_time, batch_time, total_lines)
+
+    (scalar_time, scalar) = timeCall(quat_conv.calculateAxisAngles,
+                                     quaternions)
+    (batch_time, batch) = timeCall(quat_conv.quaternionsToAxisAngles,
+                                   quaternion_array)
+    assert np.allclose(scalar, batch)
+    report("Axis angles", scalar_time, batch_time, total_lines)
+
+# Times loadColumns' decoding against the loadtxt reading it replaced, on
+# the log's lines repeated out to at least a million rows
+def benchmarkLogLoading(filename, rows=1000000):
+    with open(filename, 'rb') as file:
+        data = file.read()
+    body = imu.completeLines(data[data.find(b'\n') + 1:], 11)
+    lines = body.count(b'\n')
+    body = body * -(-rows // lines)
+    lines = body.count(b'\n')
+
+    (loadtxt_time, loadtxt) = timeCall(imu._loadBody, body, repeats=3)
+    (decode_time, decode) = timeCall(imu._parseBody, body, repeats=3)
+    for name in loadtxt:
+        assert np.array_equal(loadtxt[name], decode[name])
+    report("Log loading", loadtxt_time, decode_time, lines)
+    print("Log loading: {0:.3f} s per million rows".format(
+        decode_time * 1000000 / lines))
+
+def main(argv):
+    filename = argv[0]
+    benchmarkQuaternionConversions(filename)
+    benchmarkLogLoading(filename)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
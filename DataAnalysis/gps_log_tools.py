@@ -1,5 +1,8 @@
 import csv
 import datetime
+import io
+import numpy as np
+import imu_log_tools as imu
 
 def parseLog(file):
     reader = csv.reader(file, delimiter=',')
@@ -44,11 +47,151 @@ def parseLog(file):
     return (total_lines, indices, sys_tstamps, gps_tstamps, 
             latitudes, longitudes, altitudes)
 
+# Rebuild a GPS CSV log from the raw sentence log the logger writes
+# alongside it (lines of "System_Timestamp,<tab>$sentence*hh"). This does the
+# same conversion as GPS.formatSentence, without needing pynmea2, so raw logs
+# can be converted in bulk after the flight. Only GGA sentences carry a
+# position, so everything else is skipped. Returns the number of rows written.
+def convertRawLog(raw_file, csv_file):
+    csv_file.write("System_Timestamp,\tGPS_Timestamp\tLatitude,\t"
+                   "Longitude,\tAltitude\n")
+    rows = 0
+    for line in raw_file:
+        (sys_tstamp, sep, sentence) = line.partition(',')
+        fields = sentence.strip().split('*')[0].split(',')
+        if not fields[0].endswith('GGA') or len(fields) < 10:
+            continue
+
+        gps_time = fields[1]
+        if len(gps_time) >= 6:
+            gps_time = gps_time[0:2] + ':' + gps_time[2:4] + ':' + gps_time[4:6]
+        else:
+            gps_time = '\t'
+
+        latitude = _degreesMinutesToDegrees(fields[2], fields[3] == 'S')
+        longitude = _degreesMinutesToDegrees(fields[4], fields[5] == 'W')
+        altitude = str(float(fields[9])) if fields[9] else 'None'
+
+        csv_file.write(sys_tstamp.strip() + ",\t" + gps_time + ",\t" +
+                       str(latitude) + ",\t" + str(longitude) + ",\t" +
+                       altitude + "\n")
+        rows += 1
+    return rows
+
+# NMEA positions are (d)ddmm.mmmm
+def _degreesMinutesToDegrees(value, negative):
+    if not value or value == '0':
+        return 0.0
+    point = value.find('.')
+    if point < 0:
+        point = len(value)
+    degrees = float(value[:point - 2]) + float(value[point - 2:]) / 60
+    return -degrees if negative else degrees
+
+# Columnar alternative to parseLog. The file is parsed by numpy in one go and
+# returned as a dict of arrays:
+#   'sys_tstamp' - int64 microseconds since midnight, system clock
+#   'gps_tstamp' - int64 microseconds since midnight (UTC), -1 with no fix
+#   'latitude', 'longitude', 'altitude' - float64 degrees / metres, NaN with
+#                                         no fix
+#   'fix'        - bool, True where the receiver had a position
+# Rows without a fix are logged as 0.0, 0.0, None.
+def loadColumns(file):
+    data = file.read()
+    if isinstance(data, str):
+        data = data.encode('ascii')
+
+    # drop the header, and any partial line left by a logger that lost power
+    # mid-write
+    body_start = data.find(b'\n') + 1
+    if body_start == 0:
+        return _parseBody(b'')
+    return _parseBody(imu.completeLines(data[body_start:], 4))
+
+# Load a GPS CSV log by filename, through the column cache in imu_log_tools
+# (see loadCached) unless cache is False
+def loadLog(filename, cache=True):
+    if cache:
+        return imu.loadCached(filename, 'gps', _loadFile)
+    return _loadFile(filename)
+
+def _loadFile(filename):
+    with open(filename, 'rb') as file:
+        return loadColumns(file)
+
+# Stream a GPS CSV log in chunks of column dicts, like
+# imu_log_tools.iterateColumns. start_time is a system time of day in
+# microseconds since midnight.
+def iterateColumns(filename, chunk_rows=100000, start_time=None, workers=1):
+    cached = imu.iterateCached(filename, 'gps', chunk_rows, start_time,
+                               'sys_tstamp')
+    if cached is not None:
+        for columns in cached:
+            yield columns
+        return
+
+    with open(filename, 'rb') as file:
+        file.readline()
+        if start_time is not None:
+            imu.seekTime(file, start_time)
+        bodies = imu.readLineChunks(file, chunk_rows, 4)
+        for columns in imu.mapChunks(_parseBody, bodies, workers):
+            yield columns
+
+# Parse whole lines of a GPS CSV log (no header) into columns
+def _parseBody(body):
+    dtype = [('sys_tstamp', 'S16'), ('gps_tstamp', 'S16'),
+             ('latitude', 'f8'), ('longitude', 'f8'), ('altitude', 'f8')]
+    if body.strip():
+        rows = np.loadtxt(io.BytesIO(body.replace(b'None', b'nan')),
+                          delimiter=',', comments=None, dtype=dtype, ndmin=1)
+    else:
+        rows = np.empty(0, dtype=dtype)
+
+    sys_tstamp = imu.timestampsToMicroseconds(np.char.strip(rows['sys_tstamp']))
+    gps_field = np.char.strip(rows['gps_tstamp'])
+    timed = np.char.str_len(gps_field) >= 8
+    gps_tstamp = np.full(rows.size, -1, dtype=np.int64)
+    gps_tstamp[timed] = imu.timestampsToMicroseconds(gps_field[timed])
+
+    latitude = rows['latitude'].copy()
+    longitude = rows['longitude'].copy()
+    altitude = rows['altitude'].copy()
+    fix = (latitude != 0.0) | (longitude != 0.0)
+    latitude[~fix] = np.nan
+    longitude[~fix] = np.nan
+    altitude[~fix] = np.nan
+
+    return {
+        'sys_tstamp': sys_tstamp,
+        'gps_tstamp': gps_tstamp,
+        'latitude': latitude,
+        'longitude': longitude,
+        'altitude': altitude,
+        'fix': fix,
+    }
+
+# Estimate the offset between the payload's system clock and GPS time (UTC),
+# from the timestamps returned by loadColumns. The Pi has no real-time clock,
+# so this can be anything, but it stays constant over a flight. Each fix gives
+# one estimate, wrapped into +/- 12 hours so midnight on either clock doesn't
+# matter, and the median is taken so the odd late sentence doesn't skew it.
+# Returns microseconds to add to a system timestamp to get UTC time of day,
+# or None if there are no GPS timestamps.
 def calculateTimeDeltas(sys_tstamps, gps_tstamps):
-    # find first timestamp from gps, calculate time offset between system time
-    # and gps time - return this as we may want it to convert times to UTC 
-    # later
+    sys_tstamps = np.asarray(sys_tstamps, dtype=np.int64)
+    gps_tstamps = np.asarray(gps_tstamps, dtype=np.int64)
+    valid = gps_tstamps >= 0
+    if not valid.any():
+        return None
 
-    
+    offsets = gps_tstamps[valid] - sys_tstamps[valid]
+    half_day = imu.MICROSECONDS_PER_DAY // 2
+    offsets = (offsets + half_day) % imu.MICROSECONDS_PER_DAY - half_day
+    return int(np.median(offsets))
 
-    # return 
\ No newline at end of file
+# Convert system timestamps (microseconds since midnight) to UTC time of day
+# using an offset from calculateTimeDeltas
+def toUTC(sys_tstamps, utc_offset):
+    return (np.asarray(sys_tstamps, dtype=np.int64) + utc_offset) %\
+           imu.MICROSECONDS_PER_DAY
@@ -1,5 +1,12 @@
 import csv
+import collections
+import concurrent.futures
 import datetime
+import hashlib
+import io
+import json
+import os
+import numpy as np
 
 # To read an IMU log file
 # 1. discard first line
@@ -64,35 +71,681 @@ def parseFile(file):
 
     return (total_lines, i, tstamp, gyro, acc, quat, temp_c)
 
+# Columnar alternative to parseFile for long logs. Rather than building a
+# tuple per row, the whole file is handed to numpy's C parser in one go and
+# the result is returned as a dict of contiguous arrays:
+#   'tstamp' - int64 microseconds since midnight
+#   'gyro'   - (N, 3) float64, x y z
+#   'acc'    - (N, 3) float64, x y z
+#   'quat'   - (N, 4) float64, stored (w, x, z, y) to match parseFile
+#   'temp_c' - (N,) float64
+def loadColumns(file):
+    data = file.read()
+    if isinstance(data, str):
+        data = data.encode('ascii')
+
+    # drop the header, and any partial line left by a logger that lost power
+    # mid-write
+    body_start = data.find(b'\n') + 1
+    if body_start == 0:
+        return _emptyColumns()
+    return _parseBody(completeLines(data[body_start:], 11))
+
+# Trim data to whole lines, each ending in a newline. A final line without
+# one is kept if it has all its fields, otherwise it was cut off mid-write.
+def completeLines(data, commas):
+    end = data.rfind(b'\n') + 1
+    if data[end:].count(b',') == commas:
+        return data + b'\n'
+    return data[:end]
+
+# Parse whole lines of an IMU CSV log (no header) into columns. The lines
+# are worked through in blocks small enough for each whole array step to
+# stay in cache, which is what makes the word at a time decoding pay off.
+DECODE_BLOCK_BYTES = 1 << 18
+
+def _parseBody(body):
+    if not body:
+        return _emptyColumns()
+
+    buf = np.frombuffer(body, dtype=np.uint8)
+    columns = _emptyColumns(np.count_nonzero(buf == ord('\n')))
+    row = 0
+    for start, end in _lineBlocks(body, DECODE_BLOCK_BYTES):
+        lines = _decodeBlock(buf, start, end, columns, row)
+        if lines is None:
+            # not the logger's usual layout, let loadtxt read it or say why not
+            return _loadBody(body)
+        row += lines
+    return columns
+
+def _loadBody(body):
+    values = np.loadtxt(io.BytesIO(body), delimiter=',', comments=None,
+                        usecols=range(1, 12), ndmin=2)
+
+    buf = np.frombuffer(body, dtype=np.uint8)
+    line_starts = np.empty(values.shape[0], dtype=np.int64)
+    line_starts[0] = 0
+    line_starts[1:] = np.flatnonzero(buf == ord('\n'))[:-1] + 1
+
+    columns = _emptyColumns(values.shape[0])
+    columns['tstamp'][:] = _decodeTimestampBytes(
+        _timestampBytes(buf, line_starts), ord(','))
+    for name, fields in _VALUE_FIELDS:
+        columns[name][:] = values[:, fields].reshape(columns[name].shape)
+    return columns
+
+# Which of the 11 numbers on a line go in each column
+_VALUE_FIELDS = (
+    ('gyro', [0, 1, 2]),
+    ('acc', [3, 4, 5]),
+    # swap y and z axes, as parseFile does
+    ('quat', [9, 6, 8, 7]),
+    ('temp_c', [10]),
+)
+
+# Split whole lines into (start, end) blocks of about block_bytes each
+def _lineBlocks(body, block_bytes):
+    start = 0
+    while start < len(body):
+        end = body.find(b'\n', start + block_bytes) + 1 or len(body)
+        yield start, end
+        start = end
+
+# Decode the lines in buf[start:end] into columns from the given row on and
+# return how many there were, or None if a line isn't a timestamp and 11
+# plain decimals that fit the 8 bytes before their end: an optional sign,
+# digits, a point and more digits, with at most one space or tab before
+# them. Instead of parsing text, the 8 bytes ending each number are read as
+# one little endian word, the point found and taken out, and the digits
+# left combined a pair at a time with a few multiplies.
+def _decodeBlock(buf, start, end, columns, row):
+    separators = np.flatnonzero((buf[start:end] == ord(',')) |
+                                (buf[start:end] == ord('\n')))
+    if separators.size % 12 or separators.size == 0:
+        return None
+    separators = separators.reshape(-1, 12) + start
+    lines = separators.shape[0]
+    newlines = buf[separators[:, 11]] == ord('\n')
+    if not np.all(newlines) or np.count_nonzero(
+            buf[separators] == ord('\n')) != lines:
+        return None
+    # the first number's word would start before the buffer
+    if separators[0, 0] < 8:
+        return None
+
+    # words[i] holds buf[i:i + 8]
+    words = np.ndarray((buf.size - 7,), dtype='<u8', buffer=buf,
+                       strides=(1,))
+
+    # the word ending at each number's separator
+    widths = np.diff(separators, axis=1).ravel()
+    word = words[(separators[:, 1:] - 8).ravel()]
+
+    # the last point, with its byte's high bit set in a word of dots XORed
+    # (a '/' straight after a point can show up too, but fails below)
+    dots = word ^ _repeatByte(ord('.'))
+    point = _highestByteBits((dots - _repeatByte(0x01)) & ~dots &
+                             _repeatByte(0x80))
+
+    # close the gap it leaves, moving the whole part up a byte
+    digits = word << np.uint64(8)
+    word ^= digits
+    word &= _ALL_BITS << (point + np.uint64(8))
+    digits ^= word
+
+    # the last byte left that isn't an ASCII digit comes before the number
+    # and has to be no further up than where the point was, with at least
+    # one digit above it
+    zeroed = digits ^ _repeatByte(ord('0'))
+    before = _highestByteBits(((zeroed & _repeatByte(0x7f)) +
+                               _repeatByte(0x76) | zeroed) &
+                              _repeatByte(0x80))
+    if np.any(point - np.uint64(8) > np.uint64(48)) or np.any(
+            before > np.minimum(point, np.uint64(48))):
+        return None
+    negative = (digits >> before).astype(np.uint8) == ord('-')
+
+    # and what's left of the field has to be a single space or tab, which
+    # for a negative number is the byte below the sign
+    spaces = widths.view(np.uint64)
+    spaces += before >> np.uint64(3)
+    minus = negative.astype(np.uint64)
+    spaces -= minus
+    spaces -= np.uint64(9)
+    leading = (digits >> (before - (minus << np.uint64(3)))).astype(np.uint8)
+    if np.any(spaces > ((leading == ord(' ')) | (leading == ord('\t')))):
+        return None
+
+    # neighbouring digits, then pairs of them, then quads
+    before += np.uint64(8)
+    x = digits & (_repeatByte(0x0f) << before)
+    x *= np.uint64(10 << 8 | 1)
+    x >>= np.uint64(8)
+    x &= _repeatByte(0x00ff, 2)
+    x *= np.uint64(100 << 16 | 1)
+    x >>= np.uint64(16)
+    x &= _repeatByte(0x0000ffff, 4)
+    x *= np.uint64(10000 << 32 | 1)
+    x >>= np.uint64(32)
+
+    line_starts = np.empty(lines, dtype=np.int64)
+    line_starts[0] = start
+    line_starts[1:] = separators[:-1, 11] + 1
+    tstamps = _decodeTimestampWords(words[line_starts],
+                                    words[line_starts + 8])
+    if tstamps is None:
+        return None
+    columns['tstamp'][row:row + lines] = tstamps
+
+    # exactly the nearest double, as mantissa and power are both exact. The
+    # numbers in a column nearly always have as many decimals as each other,
+    # in which case one power per column does. Dividing by a negated power
+    # gives the sign, and -0.0 just as loadtxt does.
+    points = point.view(np.int64).reshape(lines, 11)
+    divisors = np.empty((lines, 11))
+    if np.all(points == points[0]):
+        divisors[:] = _POWERS_OF_TEN[points[0]]
+    else:
+        divisors[:] = _POWERS_OF_TEN[points]
+    signs = divisors.view(np.uint64).reshape(-1)
+    signs |= minus << np.uint64(63)
+    values = np.divide(x.view(np.int64).reshape(lines, 11), divisors,
+                       out=divisors)
+    for name, fields in _VALUE_FIELDS:
+        out = columns[name][row:row + lines]
+        out[:] = values[:, fields].reshape(out.shape)
+    return lines
+
+_ALL_BITS = np.uint64(0xffffffffffffffff)
+
+# Divisors by the bit offset of a number's point in its word
+_POWERS_OF_TEN = np.ones(57)
+_POWERS_OF_TEN[0::8] = 10.0 ** np.arange(7, -1, -1)
+
+def _repeatByte(value, size=1):
+    return np.uint64(int(('%0*x' % (2 * size, value)) * (8 // size), 16))
+
+# Per word, the bit offset (8 times the index) of the highest byte with its
+# high bit set, the only bit set in any byte, or a huge number if there's
+# none. Bytes count up from the least significant, which comes first in
+# memory. Converting to a double puts the index of the highest bit in its
+# exponent; a set top bit makes the double negative, which comes out huge
+# too, and that byte is never a valid answer anyway.
+def _highestByteBits(words):
+    exponents = words.view(np.int64).astype(np.float64).view(np.int64) >> 52
+    return (exponents - (1023 + 7)).view(np.uint64)
+
+def _emptyColumns(rows=0):
+    return {
+        'tstamp': np.empty(rows, dtype=np.int64),
+        'gyro': np.empty((rows, 3)),
+        'acc': np.empty((rows, 3)),
+        'quat': np.empty((rows, 4)),
+        'temp_c': np.empty(rows),
+    }
+
+# Timestamps are HH:MM:SS, optionally followed by a point and 1 to 6 digits
+# of fraction. The logger slices str(datetime.now().time()) to 11
+# characters, which gives two digits, or leaves out the fraction entirely on
+# the rare sample taken exactly on the second.
+TIMESTAMP_BYTES = 16
+
+# Gather the TIMESTAMP_BYTES bytes at the start of each line into an
+# (N, TIMESTAMP_BYTES) byte matrix
+def _timestampBytes(buf, line_starts):
+    offsets = line_starts[:, np.newaxis] + np.arange(TIMESTAMP_BYTES)
+    np.minimum(offsets, buf.size - 1, out=offsets)
+    return buf[offsets]
+
+# Convert an (N, TIMESTAMP_BYTES) byte matrix of timestamps, each ending at
+# a byte equal to end, into microseconds since midnight. Raises ValueError
+# on the first that isn't a valid time of day, as strptime would.
+def _decodeTimestampBytes(raw, end):
+    # bytes below '0' wrap round, so anything but a digit comes out over 9
+    digits = raw - np.uint8(ord('0'))
+    is_digit = digits < 10
+    digits = digits.astype(np.int64)
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = digits[:, 6] * 10 + digits[:, 7]
+    valid = (np.all(is_digit[:, [0, 1, 3, 4, 6, 7]], axis=1) &
+             (raw[:, 2] == ord(':')) & (raw[:, 5] == ord(':')) &
+             (hours < 24) & (minutes < 60) & (seconds < 60))
+
+    # the fraction's digits run from after the point to the end
+    places = np.argmin(is_digit[:, 9:], axis=1)
+    fraction_end = raw[np.arange(raw.shape[0]), 9 + places] == end
+    pointed = raw[:, 8] == ord('.')
+    valid &= (raw[:, 8] == end) | (pointed & (places > 0) & fraction_end)
+    if not np.all(valid):
+        bad = raw[np.argmin(valid)].tobytes()
+        raise ValueError("time data {!r} does not match format "
+                         "'%H:%M:%S.%f'".format(bad.split(bytes([end]))[0]))
+
+    fraction = digits[:, 9:15] * 10 ** np.arange(5, -1, -1)
+    fraction[np.arange(6) >= places[:, np.newaxis]] = 0
+    fraction[~pointed] = 0
+    return (((hours * 60 + minutes) * 60 + seconds) * 1000000 +
+            fraction.sum(axis=1))
+
+# _decodeTimestampBytes for the words holding the first 8 and the next 8
+# bytes of each line, or None unless every line starts the way the logger
+# writes it: HH:MM:SS, then .ff or nothing, then a comma
+def _decodeTimestampWords(clock, fraction):
+    # digits have a high nibble of 3, and a low one that doesn't carry into
+    # the high nibble when 6 is added
+    digits = clock & _CLOCK_DIGITS
+    valid = ((clock & _CLOCK_MASK) == _CLOCK_PATTERN) & \
+            (((digits + _repeatByte(0x06)) & _repeatByte(0xf0)) == 0)
+    hundredths = fraction & _FRACTION_DIGITS
+    valid &= ((fraction & np.uint64(0xff)) == ord(',')) | (
+        ((fraction & _FRACTION_MASK) == _FRACTION_PATTERN) &
+        (((hundredths + _repeatByte(0x06)) & _repeatByte(0xf0)) == 0))
+
+    # tens and units together, in the bytes of the tens
+    digits *= np.uint64(10 << 8 | 1)
+    digits >>= np.uint64(8)
+    hours = (digits & np.uint64(0xff)).view(np.int64)
+    minutes = ((digits >> np.uint64(24)) & np.uint64(0xff)).view(np.int64)
+    seconds = ((digits >> np.uint64(48)) & np.uint64(0xff)).view(np.int64)
+    valid &= (hours < 24) & (minutes < 60) & (seconds < 60)
+    if not np.all(valid):
+        return None
+
+    hundredths *= np.uint64(10 << 8 | 1)
+    hundredths = np.where((fraction & np.uint64(0xff)) == ord('.'),
+                          (hundredths >> np.uint64(16)) & np.uint64(0xff),
+                          0).view(np.int64)
+    return (((hours * 60 + minutes) * 60 + seconds) * 1000000 +
+            hundredths * 10000)
+
+def _word(data):
+    return np.uint64(int.from_bytes(data, 'little'))
+
+_CLOCK_PATTERN = _word(b'00:00:00')
+_CLOCK_MASK = _word(b'\xf0\xf0\xff\xf0\xf0\xff\xf0\xf0')
+_CLOCK_DIGITS = _word(b'\x0f\x0f\x00\x0f\x0f\x00\x0f\x0f')
+_FRACTION_PATTERN = _word(b'.00,')
+_FRACTION_MASK = _word(b'\xff\xf0\xf0\xff')
+_FRACTION_DIGITS = _word(b'\x00\x0f\x0f\x00')
+
+# Elapsed times for the HH:MM:SS.ff strings produced by parseFile. Returns
+# what calculateElapsedTimes does, so times are microseconds since midnight
+# and seconds rather than datetimes and timedeltas, and a log that runs
+# past midnight comes out right.
 def calculateTimeDeltas(timestamps):
-    time_fmt = '%H:%M:%S.%f'
-    reference_time = datetime.datetime.strptime(timestamps[0], time_fmt)
-    cumulative_elapsed_times = []
-    average_time_delta = 0
-    time_deltas = []
-    index = 0
-    previous_datetime = ''
-    current_datetime = ''
-    for t in timestamps:
-        current_datetime = datetime.datetime.strptime(t, time_fmt)
-        cumulative_elapsed_times.append((current_datetime -\
-                                         reference_time).total_seconds())
-        if index == 0:
-            time_deltas.append(datetime.timedelta(0))
+    return calculateElapsedTimes(timestampsToMicroseconds(timestamps))
+
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1000000
+
+# Vectorised replacement for parsing each timestamp with strptime. Accepts
+# the HH:MM:SS.ff strings produced by parseFile and returns int64
+# microseconds since midnight, in the same form as loadColumns' 'tstamp'
+def timestampsToMicroseconds(timestamps):
+    raw = np.array(timestamps, dtype='S%d' % TIMESTAMP_BYTES)
+    if raw.size == 0:
+        return np.empty(0, dtype=np.int64)
+    # numpy pads the strings out with NULs
+    return _decodeTimestampBytes(
+        raw.view(np.uint8).reshape(-1, TIMESTAMP_BYTES), 0)
+
+# Takes microseconds since midnight (from loadColumns or
+# timestampsToMicroseconds) and returns
+#   reference_time           - first timestamp, microseconds since midnight
+#   average_time_delta       - seconds, the elapsed time over the sample count
+#   time_deltas              - float64 seconds since the previous sample
+#   cumulative_elapsed_times - float64 seconds since the first sample
+# A log that runs past midnight wraps back to 00:00:00; any backwards jump of
+# more than half a day is taken as a rollover rather than a clock step.
+def calculateElapsedTimes(tstamps):
+    tstamps = np.asarray(tstamps, dtype=np.int64)
+    if tstamps.size == 0:
+        return (0, 0.0, np.empty(0), np.empty(0))
+
+    deltas = np.zeros(tstamps.size, dtype=np.int64)
+    deltas[1:] = np.diff(tstamps)
+    deltas[deltas < -MICROSECONDS_PER_DAY // 2] += MICROSECONDS_PER_DAY
+
+    time_deltas = deltas / 1e6
+    cumulative_elapsed_times = np.cumsum(deltas) / 1e6
+    average_time_delta = float(cumulative_elapsed_times[-1]) / tstamps.size
+
+    return (int(tstamps[0]), average_time_delta,
+            time_deltas, cumulative_elapsed_times)
+
+# Binary logs written by DataLogger/IMU/IMU.py. These dtypes mirror the
+# LOG_HEADER and LOG_RECORD structs there and must be kept in step with them.
+BINARY_LOG_MAGIC = b'IMUB'
+BINARY_LOG_VERSION = 1
+BINARY_LOG_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'),
+                              ('record_size', '<u2'), ('wall_ns', '<i8'),
+                              ('monotonic_ns', '<i8')])
+BINARY_LOG_RECORD = np.dtype([('monotonic_ns', '<i8'), ('gyro', '<f4', (3,)),
+                              ('acc', '<f4', (3,)), ('quat', '<f4', (4,)),
+                              ('temp_c', '<f4')])
+
+# Memory-map a binary IMU log. Returns the header as a numpy record and the
+# samples as a read-only structured array backed directly by the file. Any
+# partial record at the end (from a power loss mid-write) is left out.
+def mapBinaryFile(filename):
+    header = np.fromfile(filename, dtype=BINARY_LOG_HEADER, count=1)
+    if header.size == 0 or header['magic'][0] != BINARY_LOG_MAGIC:
+        raise ValueError(filename + " is not a binary IMU log")
+    header = header[0]
+    if header['version'] != BINARY_LOG_VERSION or\
+       header['record_size'] != BINARY_LOG_RECORD.itemsize:
+        raise ValueError("Unsupported binary IMU log version " +
+                         str(header['version']))
+
+    count = ((os.path.getsize(filename) - BINARY_LOG_HEADER.itemsize) //
+             BINARY_LOG_RECORD.itemsize)
+    if count == 0:
+        return (header, np.empty(0, dtype=BINARY_LOG_RECORD))
+    records = np.memmap(filename, dtype=BINARY_LOG_RECORD, mode='r',
+                        offset=BINARY_LOG_HEADER.itemsize, shape=(count,))
+    return (header, records)
+
+# Load a binary IMU log into the same dict of columns as loadColumns, so the
+# rest of the analysis tools don't need to care which format was logged.
+def loadBinaryColumns(filename):
+    (header, records) = mapBinaryFile(filename)
+    return _binaryColumns(header, records)
+
+# Time of day (microseconds since midnight) of monotonic timestamps, from
+# the wall clock / monotonic clock pair recorded when the file was created
+def _binaryTimeOfDay(header, monotonic_ns):
+    start = datetime.datetime.fromtimestamp(header['wall_ns'] // 1000000000)
+    start_us = ((start.hour * 60 + start.minute) * 60 + start.second) *\
+               1000000 + (header['wall_ns'] % 1000000000) // 1000
+    return (start_us + (monotonic_ns - header['monotonic_ns']) // 1000) %\
+           MICROSECONDS_PER_DAY
+
+def _binaryColumns(header, records):
+    tstamp = _binaryTimeOfDay(header, records['monotonic_ns'])
+    return {
+        'tstamp': np.asarray(tstamp, dtype=np.int64),
+        'gyro': np.asarray(records['gyro'], dtype=np.float64),
+        'acc': np.asarray(records['acc'], dtype=np.float64),
+        # swap y and z axes, as parseFile does
+        'quat': np.asarray(records['quat'][:, [3, 0, 2, 1]], dtype=np.float64),
+        'temp_c': np.asarray(records['temp_c'], dtype=np.float64),
+    }
+
+# Load either log format from a filename, telling them apart by the magic
+# bytes at the start of binary logs. Text logs go through the column cache
+# (see loadCached) unless cache is False.
+def loadLog(filename, cache=True):
+    with open(filename, 'rb') as file:
+        if file.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC:
+            # already memory-mapped columns, nothing to cache
+            return loadBinaryColumns(filename)
+    if cache:
+        return loadCached(filename, 'imu', _loadTextLog)
+    return _loadTextLog(filename)
+
+def _loadTextLog(filename):
+    with open(filename, 'rb') as file:
+        return loadColumns(file)
+
+# Streaming access to logs too big to load whole. iterateColumns yields the
+# same column dicts as loadLog, chunk_rows samples at a time, reading only as
+# much of the file as it needs:
+#   start_time - skip to the first sample at or after this time of day
+#                (microseconds since midnight)
+#   workers    - decode text chunks in this many processes in parallel
+# A valid column cache (see loadCached) is read instead of the text when
+# there is one, but iterating doesn't build one.
+def iterateColumns(filename, chunk_rows=100000, start_time=None, workers=1):
+    with open(filename, 'rb') as file:
+        is_binary = file.read(len(BINARY_LOG_MAGIC)) == BINARY_LOG_MAGIC
+
+    if is_binary:
+        # memory-mapped, so each chunk only touches its own part of the file
+        (header, records) = mapBinaryFile(filename)
+        start = 0
+        if start_time is not None and records.size:
+            first = _binaryTimeOfDay(header, records['monotonic_ns'][0])
+            target = records['monotonic_ns'][0] +\
+                     ((start_time - first) % MICROSECONDS_PER_DAY) * 1000
+            start = np.searchsorted(records['monotonic_ns'], target)
+        for i in range(start, records.size, chunk_rows):
+            yield _binaryColumns(header, records[i:i + chunk_rows])
+        return
+
+    cached = iterateCached(filename, 'imu', chunk_rows, start_time, 'tstamp')
+    if cached is not None:
+        for columns in cached:
+            yield columns
+        return
+
+    with open(filename, 'rb') as file:
+        file.readline()
+        if start_time is not None:
+            seekTime(file, start_time)
+        bodies = readLineChunks(file, chunk_rows, 11)
+        for columns in mapChunks(_parseBody, bodies, workers):
+            yield columns
+
+# Yield the rest of a text log from its current position as byte strings of
+# chunk_rows whole lines (fewer in the last one). Lines are expected to have
+# the given number of commas, which is used to spot a cut off final line.
+def readLineChunks(file, chunk_rows, commas, block_bytes=1 << 20):
+    blocks = []
+    lines = 0
+    while True:
+        block = file.read(block_bytes)
+        if block:
+            blocks.append(block)
+            lines += block.count(b'\n')
+            if lines < chunk_rows:
+                continue
+        data = b''.join(blocks)
+        if not block:
+            data = completeLines(data, commas)
+
+        # split off as many whole chunks as there are lines for
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) ==
+                                  ord('\n'))
+        start = 0
+        for i in range(chunk_rows - 1, newlines.size, chunk_rows):
+            yield data[start:newlines[i] + 1]
+            start = newlines[i] + 1
+        if not block:
+            if start < len(data):
+                yield data[start:]
+            return
+        blocks = [data[start:]]
+        lines = newlines.size % chunk_rows
+
+# Move a text log's position to the start of the first line at or after
+# time_of_day (microseconds since midnight). The file must be positioned at
+# the first data line. Lines are bisected by byte offset, comparing times
+# relative to the first line so a log that runs past midnight still works;
+# logs longer than a day can't be told apart by time of day alone.
+def seekTime(file, time_of_day):
+    data_start = file.tell()
+    first = _lineTime(file.readline())
+    if first is None:
+        file.seek(data_start)
+        return
+    target = (time_of_day - first) % MICROSECONDS_PER_DAY
+
+    file.seek(0, os.SEEK_END)
+    low = data_start
+    high = file.tell()
+    while high - low > 65536:
+        middle = (low + high) // 2
+        file.seek(middle)
+        file.readline()
+        position = file.tell()
+        line_time = _lineTime(file.readline())
+        if line_time is not None and\
+           (line_time - first) % MICROSECONDS_PER_DAY < target:
+            low = position
         else:
-            time_delta = (current_datetime - previous_datetime)
-            time_deltas.append(time_delta)
-            average_time_delta += time_delta.total_seconds()
-
-        previous_datetime = current_datetime
-        index += 1
-
-    average_time_delta = average_time_delta / index
-    # convert to Hz
-    # average_time_delta_Hz = (1000000 / average_time_delta)
-    # average_data_rate_string = "Average IMU read rate: " +\
-                               # str(round(average_time_delta_Hz, 3)) +\
-                               # " (Hz)"
-
-    return (reference_time, average_time_delta,
-            time_deltas, cumulative_elapsed_times)
\ No newline at end of file
+            high = middle
+
+    # finish with a short linear scan
+    file.seek(low)
+    while True:
+        position = file.tell()
+        line_time = _lineTime(file.readline())
+        if line_time is None or\
+           (line_time - first) % MICROSECONDS_PER_DAY >= target:
+            file.seek(position)
+            return
+
+# The time of a log line, or None for a line cut off before its time ended
+def _lineTime(line):
+    try:
+        return int(timestampsToMicroseconds([line.split(b',', 1)[0]])[0])
+    except ValueError:
+        return None
+
+# Apply function to each item, in order, using a pool of worker processes
+# when workers > 1. Only a couple of items per worker are in flight at once,
+# so memory use stays bounded however long the input is.
+def mapChunks(function, items, workers=1):
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Column cache. Parsing a text log is by far the slowest part of loading it,
+# so the columns are kept in a sidecar next to the log: <log>.cache.npy holds
+# them as one structured array (memory-mappable, so loading is a straight
+# read with no parsing) and <log>.cache.json holds the key it was built for.
+# The key is the log's path, size, modification time and a hash of its
+# contents, along with the kind of log and CACHE_VERSION. The hash is only
+# worked out again when the size or modification time differ from the stored
+# key's, so a cached load doesn't read the whole log; if the contents, kind,
+# path or version change, the cache is rebuilt on the next load. Bump CACHE_VERSION whenever
+# the columns a loader returns change.
+CACHE_VERSION = 1
+
+def cachePaths(filename):
+    return (filename + '.cache.npy', filename + '.cache.json')
+
+def _cacheKey(filename, kind):
+    stat = os.stat(filename)
+    key = {'version': CACHE_VERSION, 'kind': kind,
+           'path': os.path.abspath(filename), 'size': stat.st_size,
+           'mtime_ns': stat.st_mtime_ns}
+    stored = _readKey(filename)
+    if stored is not None and 'hash' in stored and\
+       all(stored.get(name) == value for (name, value) in key.items()):
+        # same size and modification time as when it was last hashed, so
+        # there's no need to read the whole log again
+        key['hash'] = stored['hash']
+        return key
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    key['hash'] = digest.hexdigest()
+    if stored is not None and stored == dict(key, size=stored.get('size'),
+                                             mtime_ns=stored.get('mtime_ns')):
+        # touched but not changed, so the cache still holds; store the new
+        # time so the next load skips the hash
+        try:
+            _writeKey(filename, key)
+        except OSError:
+            pass
+    return key
+
+def _readKey(filename):
+    try:
+        with open(cachePaths(filename)[1]) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def _writeKey(filename, key):
+    key_path = cachePaths(filename)[1]
+    with open(key_path + '.tmp', 'w') as file:
+        json.dump(key, file)
+    os.replace(key_path + '.tmp', key_path)
+
+# Return the cached records for filename if the cache matches key, else None
+def _readCache(filename, key, mmap_mode=None):
+    if _readKey(filename) != key:
+        return None
+    try:
+        return np.load(cachePaths(filename)[0], mmap_mode=mmap_mode,
+                       allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+
+def _writeCache(filename, key, columns):
+    (data_path, key_path) = cachePaths(filename)
+    dtype = [(name, values.dtype, values.shape[1:])
+             for (name, values) in columns.items()]
+    rows = len(next(iter(columns.values()))) if columns else 0
+    records = np.empty(rows, dtype=dtype)
+    for (name, values) in columns.items():
+        records[name] = values
+
+    # the key goes last, and is removed first, so a half written cache is
+    # never taken as valid. A log in a read-only directory just isn't cached.
+    try:
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        with open(data_path + '.tmp', 'wb') as file:
+            np.save(file, records, allow_pickle=False)
+        os.replace(data_path + '.tmp', data_path)
+        _writeKey(filename, key)
+    except OSError:
+        pass
+
+def _recordsToColumns(records):
+    return dict((name, np.array(records[name]))
+                for name in records.dtype.names)
+
+# Load filename with load(filename), going through the column cache. kind
+# names the loader, so different loaders never share a cache.
+def loadCached(filename, kind, load):
+    # keyed before parsing, so a log changed mid-parse is rebuilt next time
+    key = _cacheKey(filename, kind)
+    records = _readCache(filename, key)
+    if records is not None:
+        return _recordsToColumns(records)
+    columns = load(filename)
+    _writeCache(filename, key, columns)
+    return columns
+
+# Chunked iteration over a valid column cache, for iterateColumns. Returns a
+# generator, or None if there is no valid cache. time_column is the column
+# of microseconds since midnight to seek start_time in.
+def iterateCached(filename, kind, chunk_rows, start_time, time_column):
+    records = _readCache(filename, _cacheKey(filename, kind), mmap_mode='r')
+    if records is None:
+        return None
+    return _iterateRecords(records, chunk_rows, start_time, time_column)
+
+def _iterateRecords(records, chunk_rows, start_time, time_column):
+    start = 0
+    if start_time is not None and records.size:
+        # bisect on time since the first sample, as seekTime does
+        times = records[time_column]
+        first = int(times[0])
+        target = (start_time - first) % MICROSECONDS_PER_DAY
+        high = records.size
+        while start < high:
+            middle = (start + high) // 2
+            if (int(times[middle]) - first) % MICROSECONDS_PER_DAY < target:
+                start = middle + 1
+            else:
+                high = middle
+    for i in range(start, records.size, chunk_rows):
+        yield _recordsToColumns(records[i:i + chunk_rows])
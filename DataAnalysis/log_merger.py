@@ -0,0 +1,215 @@
+import numpy as np
+import imu_log_tools as imu
+
+# Joins the IMU stream (~30 Hz) with the GPS stream (1 Hz) on the system
+# clock timestamps both loggers record. Both streams are expected in the
+# column dict form returned by imu_log_tools.loadColumns and
+# gps_log_tools.loadColumns.
+#
+# The join produces two timelines:
+#   - the IMU samples, with latitude, longitude and altitude linearly
+#     interpolated from the GPS fixes either side
+#   - the GPS fixes, with the payload orientation SLERPed from the IMU
+#     quaternions either side
+# Samples outside the span of the other stream get NaN.
+
+DAY = imu.MICROSECONDS_PER_DAY
+
+# Undo midnight rollover in a stream of microseconds-since-midnight
+# timestamps. previous is the last (unwrapped) timestamp of the preceding
+# chunk when streaming, so the day count carries across chunks.
+def unwrapTimestamps(tstamps, previous=None):
+    tstamps = np.asarray(tstamps, dtype=np.int64)
+    if tstamps.size == 0:
+        return tstamps.copy()
+    rollovers = np.zeros(tstamps.size, dtype=np.int64)
+    rollovers[1:] = np.diff(tstamps) < -DAY // 2
+    unwrapped = tstamps + np.cumsum(rollovers) * DAY
+    if previous is not None:
+        # carry on from the day the previous chunk finished on
+        unwrapped += previous - previous % DAY
+        if unwrapped[0] < previous - DAY // 2:
+            unwrapped += DAY
+    return unwrapped
+
+# For each time in query_times, the index of the last time in times that is
+# at or before it (-1 if there is none). Both arrays must be sorted. The
+# concatenation is two sorted runs, which a stable sort merges in a single
+# O(N+M) pass.
+def asofIndices(query_times, times):
+    merged = np.concatenate((times, query_times))
+    order = np.argsort(merged, kind='stable')
+    # ties sort times first, so a sample exactly on a fix counts it as before
+    before = np.cumsum(order < times.size) - 1
+    is_query = order >= times.size
+    indices = np.empty(query_times.size, dtype=np.int64)
+    indices[order[is_query] - times.size] = before[is_query]
+    return indices
+
+# Linear interpolation of values (N, ...) sampled at times onto query_times,
+# using as-of indices from asofIndices. NaN outside the sampled span.
+def _interpolate(query_times, times, values, indices):
+    inside = (indices >= 0) & (indices < times.size - 1)
+    lo = np.clip(indices, 0, max(times.size - 2, 0))
+    hi = np.minimum(lo + 1, times.size - 1)
+
+    span = (times[hi] - times[lo]).astype(np.float64)
+    span[span == 0] = 1
+    fraction = (query_times - times[lo]) / span
+
+    # a query exactly on the last sample is inside too
+    on_last = (times.size > 0) & (indices == times.size - 1) &\
+              (query_times == times[-1])
+    fraction[on_last] = 1.0
+    inside |= on_last
+
+    fraction = fraction.reshape((-1,) + (1,) * (values.ndim - 1))
+    result = values[lo] + (values[hi] - values[lo]) * fraction
+    result[~inside] = np.nan
+    return result
+
+# Spherical linear interpolation between (N, 4) quaternion arrays q0 and q1 by
+# fraction t (N,). Takes the short way round, and falls back to a normalised
+# linear interpolation when the two are almost identical.
+def slerp(q0, q1, t):
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.array(q1, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[:, np.newaxis]
+
+    dot = np.einsum('ij,ij->i', q0, q1)
+    flip = dot < 0
+    q1[flip] *= -1
+    dot = np.abs(dot)[:, np.newaxis]
+
+    linear = dot > 0.9995
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    sin_theta[linear] = 1.0
+    w0 = np.where(linear, 1 - t, np.sin((1 - t) * theta) / sin_theta)
+    w1 = np.where(linear, t, np.sin(t * theta) / sin_theta)
+
+    result = w0 * q0 + w1 * q1
+    result /= np.linalg.norm(result, axis=1)[:, np.newaxis]
+    return result
+
+def _fixPositions(gps, gps_times):
+    fix = gps['fix']
+    positions = np.column_stack((gps['latitude'][fix], gps['longitude'][fix],
+                                 gps['altitude'][fix]))
+    return (gps_times[fix], positions)
+
+# Positions at the IMU sample times, as an (N, 3) array
+def _positionsAtIMU(imu_times, fix_times, positions):
+    if fix_times.size == 0:
+        return np.full((imu_times.size, 3), np.nan)
+    indices = asofIndices(imu_times, fix_times)
+    return _interpolate(imu_times, fix_times, positions, indices)
+
+# Orientation at the GPS times, as an (M, 4) array of (w, x, z, y) like the
+# IMU quaternions
+def _quaternionsAtGPS(gps_times, imu_times, quaternions):
+    result = np.full((gps_times.size, 4), np.nan)
+    if imu_times.size < 2:
+        return result
+    indices = asofIndices(gps_times, imu_times)
+    inside = (indices >= 0) & (indices < imu_times.size - 1)
+    lo = indices[inside]
+    span = (imu_times[lo + 1] - imu_times[lo]).astype(np.float64)
+    span[span == 0] = 1
+    fraction = (gps_times[inside] - imu_times[lo]) / span
+    result[inside] = slerp(quaternions[lo], quaternions[lo + 1], fraction)
+    exact = (indices == imu_times.size - 1) & (gps_times == imu_times[-1])
+    last = quaternions[-1:]
+    result[exact] = slerp(last, last, [0.0])
+    return result
+
+def _imuTimeline(imu_columns, imu_times, positions):
+    timeline = dict(imu_columns)
+    timeline['time'] = imu_times
+    timeline['latitude'] = positions[:, 0]
+    timeline['longitude'] = positions[:, 1]
+    timeline['altitude'] = positions[:, 2]
+    return timeline
+
+def _gpsTimeline(gps_columns, gps_times, select, quaternions):
+    timeline = dict((name, values[select])
+                    for (name, values) in gps_columns.items())
+    timeline['time'] = gps_times[select]
+    timeline['quat'] = quaternions
+    return timeline
+
+# Join whole IMU and GPS logs held in memory. Returns (imu_timeline,
+# gps_timeline): the input column dicts with the interpolated columns added,
+# plus a 'time' column of unwrapped system clock microseconds.
+def mergeLogs(imu_columns, gps_columns):
+    imu_times = unwrapTimestamps(imu_columns['tstamp'])
+    gps_times = _alignedGPSTimes(gps_columns, imu_times)
+    (fix_times, positions) = _fixPositions(gps_columns, gps_times)
+
+    imu_timeline = _imuTimeline(imu_columns, imu_times,
+                                _positionsAtIMU(imu_times, fix_times,
+                                                positions))
+    gps_timeline = _gpsTimeline(gps_columns, gps_times,
+                                np.ones(gps_times.size, dtype=bool),
+                                _quaternionsAtGPS(gps_times, imu_times,
+                                                  imu_columns['quat']))
+    return (imu_timeline, gps_timeline)
+
+# Same as mergeLogs, but over an iterable of IMU column chunks (in time
+# order) so IMU logs larger than memory can be joined. The GPS log is 1 Hz,
+# so it is small enough to hold whole. Yields (imu_timeline, gps_timeline)
+# per chunk, where gps_timeline holds the GPS rows that fall after the
+# previous chunk's last sample, up to this chunk's last sample. GPS rows
+# after the end of the IMU log are never yielded.
+def streamMerge(imu_chunks, gps_columns):
+    gps_times = None
+    fix_times = None
+    positions = None
+    previous_time = None
+    previous_quat = None
+    gps_start = 0
+
+    for chunk in imu_chunks:
+        if chunk['tstamp'].size == 0:
+            continue
+        imu_times = unwrapTimestamps(chunk['tstamp'], previous_time)
+        if gps_times is None:
+            gps_times = _alignedGPSTimes(gps_columns, imu_times)
+            (fix_times, positions) = _fixPositions(gps_columns, gps_times)
+
+        # only the fixes around this chunk take part in the join
+        lo = max(np.searchsorted(fix_times, imu_times[0], 'right') - 1, 0)
+        hi = np.searchsorted(fix_times, imu_times[-1], 'left') + 1
+        imu_timeline = _imuTimeline(chunk, imu_times,
+                                    _positionsAtIMU(imu_times,
+                                                    fix_times[lo:hi],
+                                                    positions[lo:hi]))
+
+        # carry the previous chunk's last sample over so GPS times between
+        # chunks still have samples either side
+        gps_end = np.searchsorted(gps_times, imu_times[-1], 'right')
+        select = np.zeros(gps_times.size, dtype=bool)
+        select[gps_start:gps_end] = True
+        if previous_time is None:
+            slerp_times = imu_times
+            slerp_quat = chunk['quat']
+        else:
+            slerp_times = np.concatenate(([previous_time], imu_times))
+            slerp_quat = np.concatenate((previous_quat[np.newaxis],
+                                         chunk['quat']))
+        gps_timeline = _gpsTimeline(gps_columns, gps_times, select,
+                                    _quaternionsAtGPS(gps_times[select],
+                                                      slerp_times, slerp_quat))
+
+        previous_time = imu_times[-1]
+        previous_quat = chunk['quat'][-1]
+        gps_start = gps_end
+        yield (imu_timeline, gps_timeline)
+
+# GPS system timestamps unwrapped onto the same day count as the IMU times
+def _alignedGPSTimes(gps_columns, imu_times):
+    gps_times = unwrapTimestamps(gps_columns['sys_tstamp'])
+    if gps_times.size and imu_times.size:
+        days = np.round((imu_times[0] - gps_times[0]) / DAY)
+        gps_times = gps_times + int(days) * DAY
+    return gps_times
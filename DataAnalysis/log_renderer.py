@@ -0,0 +1,217 @@
+import os
+import shutil
+import subprocess
+import sys
+import matplotlib.image
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+import imu_log_tools as imu
+
+# Offscreen version of log_visualiser, for machines without a browser. Renders
+# the payload orientation from an IMU log at a fixed frame rate to numbered
+# PNG frames, or pipes the frames to ffmpeg for an MP4 or GIF.
+#
+# usage: log_renderer.py <imu log> <output> [fps] [speed] [workers]
+#   output  - a directory for the frames, or a .mp4 or .gif file (without
+#             ffmpeg, frames go to a directory named after the file instead)
+#   fps     - frames per second of the output, default 30
+#   speed   - log seconds per second of output, default 1
+#   workers - rendering processes, default one per CPU
+#
+# Frames are drawn with matplotlib's Agg backend. Each worker process sets up
+# one figure, draws the axes once and then only redraws the payload and
+# caption over them for each frame, in contiguous batches of frames.
+
+FRAME_SIZE = (640, 640)
+FRAME_DPI = 100
+BATCH_FRAMES = 200
+# 640x640 RGBA is 1.6 MB a frame
+RAW_BATCH_FRAMES = 25
+
+# payload box, the same size as in log_visualiser
+PAYLOAD_SIZE = (1.2, 1.4, 0.9)
+PAYLOAD_FACES = ((0, 1, 3, 2), (4, 5, 7, 6), (0, 1, 5, 4),
+                 (2, 3, 7, 6), (0, 2, 6, 4), (1, 3, 7, 5))
+PAYLOAD_COLOURS = ('tab:red', 'tab:red', 'tab:green', 'tab:green',
+                   'tab:blue', 'tab:blue')
+
+def _payloadCorners():
+    half = np.array(PAYLOAD_SIZE) / 2
+    signs = np.array([(x, y, z) for x in (-1, 1) for y in (-1, 1)
+                      for z in (-1, 1)])
+    return signs * half
+
+# Rotation matrices (N, 3, 3) of quaternions in the (w, x, y, z) form the
+# loaders return
+def quaternionsToMatrices(quaternions):
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    q = q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+    (w, x, y, z) = q.T
+    matrices = np.empty((q.shape[0], 3, 3))
+    matrices[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    matrices[:, 0, 1] = 2 * (x * y - z * w)
+    matrices[:, 0, 2] = 2 * (x * z + y * w)
+    matrices[:, 1, 0] = 2 * (x * y + z * w)
+    matrices[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    matrices[:, 1, 2] = 2 * (y * z - x * w)
+    matrices[:, 2, 0] = 2 * (x * z - y * w)
+    matrices[:, 2, 1] = 2 * (y * z + x * w)
+    matrices[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return matrices
+
+# Index of the sample to show in each frame: the last one at or before the
+# frame's log time
+def frameIndices(elapsed_times, fps, speed=1):
+    if elapsed_times.size == 0:
+        return np.empty(0, dtype=np.int64)
+    frame_times = np.arange(0, elapsed_times[-1] + 1e-9, speed / fps)
+    return np.searchsorted(elapsed_times, frame_times, 'right') - 1
+
+# Figure shared by every batch a process renders: (canvas, payload,
+# caption, background). Everything but the payload and caption is drawn once
+# into background, which each frame starts from.
+_frame_figure = None
+
+def _frameFigure():
+    global _frame_figure
+    if _frame_figure is not None:
+        return _frame_figure
+
+    figure = Figure(figsize=(FRAME_SIZE[0] / FRAME_DPI,
+                             FRAME_SIZE[1] / FRAME_DPI), dpi=FRAME_DPI)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_subplot(projection='3d')
+    axes.set_xlim(-1, 1)
+    axes.set_ylim(-1, 1)
+    axes.set_zlim(-1, 1)
+    axes.set_box_aspect((1, 1, 1))
+    axes.set_xlabel("x")
+    axes.set_ylabel("-z")
+    axes.set_zlabel("y")
+    # same point of view as log_visualiser's forward = (1, -1, -1)
+    axes.view_init(elev=35, azim=-135)
+    payload = Poly3DCollection([], facecolors=PAYLOAD_COLOURS,
+                               edgecolors='k', alpha=0.8, visible=False)
+    axes.add_collection3d(payload)
+    caption = figure.text(0.02, 0.96, "", visible=False)
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    payload.set_visible(True)
+    caption.set_visible(True)
+
+    _frame_figure = (canvas, payload, caption, background)
+    return _frame_figure
+
+# Draw each frame of a batch in turn, yielding the canvas holding it
+def _drawFrames(quaternions, temperatures, frame_times):
+    (canvas, payload, caption, background) = _frameFigure()
+    axes = payload.axes
+    corners = _payloadCorners()
+    # log_visualiser's y axis is up, so plot (x, y, z) as (x, -z, y)
+    to_plot = np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
+    for (i, matrix) in enumerate(quaternionsToMatrices(quaternions)):
+        points = corners @ matrix.T @ to_plot.T
+        payload.set_verts([points[list(face)] for face in PAYLOAD_FACES])
+        caption.set_text("t = %.2f s   Temperature (C): %s"
+                         % (frame_times[i], temperatures[i]))
+        canvas.restore_region(background)
+        payload.do_3d_projection()
+        axes.draw_artist(payload)
+        canvas.figure.draw_artist(caption)
+        yield canvas
+
+# Render one batch of frames to PNGs. Takes a single tuple so it can go
+# through imu.mapChunks: (directory, first frame number, quaternions,
+# temperatures, frame times). Returns the number of frames written.
+def renderBatch(batch):
+    (directory, first, quaternions, temperatures, frame_times) = batch
+    for (i, canvas) in enumerate(_drawFrames(quaternions, temperatures,
+                                             frame_times)):
+        matplotlib.image.imsave(
+            os.path.join(directory, "frame_%06d.png" % (first + i)),
+            canvas.buffer_rgba(), format='png', dpi=FRAME_DPI)
+    return len(quaternions)
+
+# Render one batch of frames as raw RGBA, FRAME_SIZE pixels each, one after
+# the other. Takes (quaternions, temperatures, frame times).
+def renderRawBatch(batch):
+    return b''.join(bytes(canvas.buffer_rgba())
+                    for canvas in _drawFrames(*batch))
+
+# Sample indices and times of each frame
+def _frameSamples(columns, fps, speed):
+    elapsed_times = imu.calculateElapsedTimes(columns['tstamp'])[3]
+    indices = frameIndices(elapsed_times, fps, speed)
+    return (indices, np.arange(indices.size) * speed / fps)
+
+# Render columns (as from imu.loadLog) to PNG frames in directory. Returns
+# the number of frames.
+def renderFrames(columns, directory, fps=30, speed=1, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    (indices, frame_times) = _frameSamples(columns, fps, speed)
+
+    # each batch carries only its own samples to the worker
+    batches = ((directory, start,
+                columns['quat'][indices[start:start + BATCH_FRAMES]],
+                columns['temp_c'][indices[start:start + BATCH_FRAMES]],
+                frame_times[start:start + BATCH_FRAMES])
+               for start in range(0, indices.size, BATCH_FRAMES))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return sum(imu.mapChunks(renderBatch, batches, workers))
+
+# Render columns straight into an MP4 or GIF, piping raw frames to ffmpeg's
+# stdin so none are written to disk. Returns the number of frames.
+def renderVideo(columns, output, fps=30, speed=1, workers=None):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is needed to write " + output +
+                           ", render to a directory of frames instead")
+    (indices, frame_times) = _frameSamples(columns, fps, speed)
+
+    # raw frames are big, so batches are kept short
+    batches = ((columns['quat'][indices[start:start + RAW_BATCH_FRAMES]],
+                columns['temp_c'][indices[start:start + RAW_BATCH_FRAMES]],
+                frame_times[start:start + RAW_BATCH_FRAMES])
+               for start in range(0, indices.size, RAW_BATCH_FRAMES))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo',
+               '-pix_fmt', 'rgba', '-s', '%dx%d' % FRAME_SIZE,
+               '-framerate', str(fps), '-i', '-']
+    if output.endswith('.gif'):
+        command += ['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse']
+    else:
+        command += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p']
+    encoder = subprocess.Popen(command + [output], stdin=subprocess.PIPE)
+    try:
+        for frames in imu.mapChunks(renderRawBatch, batches, workers):
+            encoder.stdin.write(frames)
+    finally:
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise subprocess.CalledProcessError(encoder.returncode, command)
+    return indices.size
+
+def main(argv):
+    columns = imu.loadLog(argv[0])
+    output = argv[1]
+    fps = float(argv[2]) if len(argv) > 2 else 30
+    speed = float(argv[3]) if len(argv) > 3 else 1
+    workers = int(argv[4]) if len(argv) > 4 else None
+
+    if output.endswith(('.mp4', '.gif')) and shutil.which('ffmpeg'):
+        frames = renderVideo(columns, output, fps, speed, workers)
+    else:
+        if output.endswith(('.mp4', '.gif')):
+            output = os.path.splitext(output)[0]
+            print("ffmpeg not found, writing PNG frames instead")
+        frames = renderFrames(columns, output, fps, speed, workers)
+    print("rendered", frames, "frames to", output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
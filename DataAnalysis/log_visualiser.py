@@ -1,5 +1,6 @@
 import sys
-from pyquaternion import Quaternion
+import time
+import numpy as np
 from vpython import *
 
 import quaternion_conversions as quat_conv
@@ -12,15 +13,6 @@ pendulum_mode = False
 # each quaternion is stored in the form (w,    x,    y,    z)
 #                                       q[0], q[1], q[2], q[3]
 
-def buildQuaternionObjects(quaternions):
-    quat_OBJs = []
-    for q in quaternions:
-        # swap y and z axes for visualisation purposes
-        # now done in the log parsing
-        quat_OBJ = Quaternion((q[0], q[1], q[2], q[3]))
-        quat_OBJs.append(quat_OBJ)
-    return quat_OBJs
-
 def build3DVisualisation(balloon_train_length):
     scene_3d = canvas(title="IMU 3D Orientation", height = 700, width = 700)
     scene_3d.range = balloon_train_length / 2 + 2
@@ -49,10 +41,8 @@ def build3DVisualisation(balloon_train_length):
 
     return (scene_3d, objects_3d)
 
-def update3DVisualisationObjects(quaternion_OBJ, objects, balloon_train_length):
-    rotation_axis = quaternion_OBJ.get_axis(undefined=[0, 1, 0])
-    rotation_angle = quaternion_OBJ.radians
-    
+def update3DVisualisationObjects(rotation_axis, rotation_angle, objects,
+                                 balloon_train_length):
     # objects[0] = payload
     objects[0].up = vec(0, 1, 0)
     objects[0].axis = vec(1.2, 0, 0)
@@ -136,12 +126,10 @@ def build2DVisualisation():
 
     return scene_2d, objects_2d
 
-def update2DVisualisation(objects_2d, quaternion_OBJ, temperature):
+def update2DVisualisation(objects_2d, rotation_axis, rotation_angle,
+                          temperature):
     objects_2d[0].text = "Temperature (C): " + str(temperature)
 
-    rotation_axis = quaternion_OBJ.get_axis(undefined=[0, 1, 0])
-    rotation_angle = quaternion_OBJ.radians
-
     # need to make the representations of each axis move
     # objects_2d[1].axis = 
     # objects_2d[1].up = 
@@ -158,17 +146,41 @@ def update2DVisualisation(objects_2d, quaternion_OBJ, temperature):
     objects_2d[2].axis = proj(objects_2d[2].axis, vec(1,0,0))
     objects_2d[2].axis.mag = 0.2
 
-def playback(indices, time_deltas, quaternion_OBJs, objects_3d, 
-             balloon_train_length, objects_2d, temperatures):
-    for index in indices:
-        update3DVisualisationObjects(quaternion_OBJs[index], objects_3d,
-                                   balloon_train_length)
-        update2DVisualisation(objects_2d, quaternion_OBJs[index], 
-                              temperatures[index])
-        time.sleep(time_deltas[index].total_seconds())
+# Play back frames at log times (elapsed seconds), with rotations from
+# quat_conv.quaternionsToRotations. Pacing is anchored to the wall clock:
+# clock_start is the time.monotonic() at which log time 0 was (or is to be)
+# shown, and speed is how many log seconds go by per real second. Each frame
+# is shown at its time, however long drawing the previous one took, and when
+# drawing falls behind the frames that are already overdue are skipped.
+# Returns the number of frames skipped.
+def playback(times, rotation_axes, rotation_angles, objects_3d,
+             balloon_train_length, objects_2d, temperatures,
+             clock_start, speed=1):
+    skipped = 0
+    index = 0
+    while index < times.size:
+        update3DVisualisationObjects(rotation_axes[index],
+                                     rotation_angles[index], objects_3d,
+                                     balloon_train_length)
+        update2DVisualisation(objects_2d, rotation_axes[index],
+                              rotation_angles[index], temperatures[index])
+
+        # on to the latest frame that is due by now, or wait for the next
+        log_time = (time.monotonic() - clock_start) * speed
+        due = np.searchsorted(times, log_time, 'right') - 1
+        if due > index + 1:
+            skipped += due - index - 1
+            index = due
+        else:
+            index += 1
+            if index < times.size:
+                delay = clock_start + times[index] / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    return skipped
 
 def main(argv):
-    file = open(argv[0])
+    filename = argv[0]
     balloon_train_length = float(argv[1])
     
     mode = argv[2]
@@ -178,25 +190,40 @@ def main(argv):
     elif mode == "o":
         pendulum_mode = False
 
-    (total_lines, indices, timestamps, gyro_data,
-     acc_data, quaternions, temperatures)          = imu.parseFile(file)
-
-    # euler_angles = quat_conv.calculateEulerAngles(quaternions)
-    # axis_angles = quat_conv.calculateAxisAngles(quaternions)
-    
-    (reference_time, average_time_delta, time_deltas, 
-     cumulative_elapsed_times) = imu.calculateTimeDeltas(timestamps)
-
-    quaternion_OBJs = buildQuaternionObjects(quaternions)
+    # replay speed, e.g. 10 for 10x
+    speed = float(argv[3]) if len(argv) > 3 else 1.0
 
     (scene_3d, objects_3d) = build3DVisualisation(balloon_train_length)
 
     (scene_2d, objects_2d) = build2DVisualisation()
+
+    # play the log back a chunk at a time, so logs of any length fit in memory
+    previous_tstamp = None
+    elapsed = 0.0
+    skipped = 0
+    clock_start = time.monotonic()
+    for columns in imu.iterateColumns(filename, chunk_rows=10000):
+        tstamps = columns['tstamp']
+        if tstamps.size == 0:
+            continue
+        if previous_tstamp is None:
+            time_deltas = imu.calculateElapsedTimes(tstamps)[2]
+        else:
+            # carry the gap from the end of the last chunk over
+            time_deltas = imu.calculateElapsedTimes(
+                np.concatenate(([previous_tstamp], tstamps)))[2][1:]
+        previous_tstamp = tstamps[-1]
+        times = elapsed + np.cumsum(time_deltas)
+        elapsed = times[-1]
+
+        (rotation_axes,
+         rotation_angles) = quat_conv.quaternionsToRotations(columns['quat'])
+
+        skipped += playback(times, rotation_axes, rotation_angles,
+                            objects_3d, balloon_train_length, objects_2d,
+                            columns['temp_c'], clock_start, speed)
     
-    playback(indices, time_deltas, quaternion_OBJs,
-             objects_3d, balloon_train_length, objects_2d,
-             temperatures)
-    
+    print("skipped", skipped, "frames to keep up")
     print("finished playback")
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+import numpy as np
+
+# Min/max-per-pixel decimation for line plots of long logs. Drawing every
+# sample of a full flight makes matplotlib crawl, but a line can't show more
+# detail than one vertical stroke per pixel column anyway. So the samples in
+# view are split into one bucket per pixel across the axes, and only the
+# minimum and maximum of each bucket are plotted: at most two points per
+# pixel, and no peak is ever dropped. The line is re-decimated whenever the
+# x limits or the figure size change, so zooming in brings back the detail.
+
+# Indices of the points to draw of x (sorted) and y, for the x range
+# [start, stop] spread over the given number of buckets. The point either
+# side of the range is kept too, so the line runs off the edges of the axes.
+def minMaxIndices(x, y, start, stop, buckets):
+    lo = max(np.searchsorted(x, start, 'left') - 1, 0)
+    hi = min(np.searchsorted(x, stop, 'right') + 1, x.size)
+    if hi - lo <= 2 * buckets or stop <= start:
+        return np.arange(lo, hi)
+
+    # first sample of each non-empty bucket
+    edges = np.linspace(start, stop, buckets + 1)[1:-1]
+    starts = np.unique(np.concatenate(([lo],
+                                       np.searchsorted(x[lo:hi], edges) + lo)))
+    starts = starts[starts < hi]
+    counts = np.diff(np.append(starts, hi))
+    bucket = np.repeat(np.arange(starts.size), counts)
+    view = y[lo:hi]
+
+    # the first index in each bucket where it hits its minimum and maximum
+    extremes = [lo, hi - 1]
+    for reduce in (np.fmin, np.fmax):
+        values = np.repeat(reduce.reduceat(view, starts - lo), counts)
+        hits = np.flatnonzero(view == values)
+        (_, first) = np.unique(bucket[hits], return_index=True)
+        extremes.append(hits[first] + lo)
+    return np.unique(np.concatenate([np.atleast_1d(e) for e in extremes]))
+
+# Plot y against x (sorted, e.g. elapsed seconds) on axes through the
+# decimation. Takes the same keyword arguments as axes.plot, and returns the
+# Line2D.
+def plotDecimated(axes, x, y, **kwargs):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    def decimate(start, stop):
+        width = int(axes.get_window_extent().width)
+        return minMaxIndices(x, y, start, stop, max(width, 1))
+
+    indices = decimate(x[0], x[-1]) if x.size else np.arange(0)
+    (line,) = axes.plot(x[indices], y[indices], **kwargs)
+
+    def update(*args):
+        (start, stop) = axes.get_xlim()
+        indices = decimate(start, stop)
+        line.set_data(x[indices], y[indices])
+        axes.figure.canvas.draw_idle()
+
+    if x.size:
+        axes.callbacks.connect('xlim_changed', update)
+        axes.figure.canvas.mpl_connect('resize_event', update)
+    return line
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 # each quaternion is stored in the form (w,    x,    y,    z)
 #                                       q[0], q[1], q[2], q[3]
@@ -44,4 +45,65 @@ def calculateAxisAngles(quaternions):
     axis_angles = []
     for q in quaternions:
         axis_angles.append(quaternionToAxisAngle(q))
-    return axis_angles
\ No newline at end of file
+    return axis_angles
+
+# Batch versions of the conversions above. Both take an (N, 4) array of
+# (w, x, y, z) quaternions and work a column at a time, so no Python objects
+# are created per sample.
+
+# Returns an (N, 3) array of (roll, pitch, yaw) in degrees
+def quaternionsToEulerAngles(quaternions):
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    ysqr = y * y
+
+    euler_angles = np.empty((q.shape[0], 3))
+
+    t0 = 2.0 * (w * x + y * z)
+    t1 = 1.0 - 2.0 * (x * x + ysqr)
+    euler_angles[:, 0] = np.arctan2(t0, t1)
+
+    # clamp to avoid asin domain errors near gimbal lock
+    t2 = np.clip(2.0 * (w * y - z * x), -1.0, 1.0)
+    euler_angles[:, 1] = np.arcsin(t2)
+
+    t3 = 2.0 * (w * z + x * y)
+    t4 = 1.0 - 2.0 * (ysqr + z * z)
+    euler_angles[:, 2] = np.arctan2(t3, t4)
+
+    return np.degrees(euler_angles, out=euler_angles)
+
+# Returns an (N, 4) array of (angle, axis_x, axis_y, axis_z), angle in
+# radians. The logged quaternions are rounded to 3 decimal places, so w is
+# clipped to [-1, 1] before taking acos and sqrt.
+def quaternionsToAxisAngles(quaternions):
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    w = np.clip(q[:, 0], -1.0, 1.0)
+
+    axis_angles = np.empty((q.shape[0], 4))
+    axis_angles[:, 0] = 2 * np.arccos(w)
+
+    # as in quaternionToAxisAngle, leave the vector part unscaled where the
+    # divisor is close to zero
+    equation_part = np.sqrt(1 - w * w)
+    equation_part[equation_part < 0.001] = 1.0
+    np.divide(q[:, 1:], equation_part[:, np.newaxis], out=axis_angles[:, 1:])
+
+    return axis_angles
+
+# Rotation axis (N, 3) and angle in radians (N,) of each quaternion, matching
+# pyquaternion's Quaternion.get_axis(undefined=[0, 1, 0]) and .radians, for
+# precomputing a whole replay at once
+def quaternionsToRotations(quaternions):
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    q = q / np.linalg.norm(q, axis=1)[:, np.newaxis]
+    norm = np.linalg.norm(q[:, 1:], axis=1)
+
+    # wrapped into (-pi, pi] as pyquaternion does
+    angles = np.pi - (np.pi - 2 * np.arctan2(norm, q[:, 0])) % (2 * np.pi)
+
+    axes = np.empty((q.shape[0], 3))
+    axes[:] = (0.0, 1.0, 0.0)
+    defined = norm >= 1e-17
+    axes[defined] = q[defined, 1:] / norm[defined, np.newaxis]
+    return (axes, angles)
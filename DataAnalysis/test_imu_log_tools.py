@@ -0,0 +1,116 @@
+"""
+Tests for imu_log_tools' columnar loading against parseFile.
+
+python -m pytest test_imu_log_tools.py
+"""
+
+import io
+import os
+
+import numpy as np
+import pytest
+
+import imu_log_tools as imu
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOGS = [os.path.join(HERE, name) for name in (
+    'test_data/imu.csv', 'test_data/test.csv',
+    'flight_data/f_imu_slice_over_30k.csv')]
+
+HEADER = b'Timestamp,\tGyro_x,\tGyro_y,\tGyro_z,\tAcc_x,\tAcc_y,\tAcc_z,\t' \
+         b'Orie_x,\tOrie_y,\tOrie_z,\tOrie_w,\tTemp_C\n'
+VALUES = b',\t0.036,\t-0.066,\t-0.294,\t-0.200,\t0.200,\t-0.950,\t-0.017,' \
+         b'\t0.045,\t-0.790,\t-0.611,\t7.00\n'
+
+def log(*timestamps):
+    return HEADER + b''.join(t + VALUES for t in timestamps)
+
+def parsedColumns(data):
+    (total_lines, i, tstamp, gyro, acc, quat, temp_c) = imu.parseFile(
+        io.StringIO(data.decode('ascii')))
+    return {
+        'tstamp': imu.timestampsToMicroseconds(tstamp),
+        'gyro': np.array(gyro).reshape(-1, 3),
+        'acc': np.array(acc).reshape(-1, 3),
+        'quat': np.array(quat).reshape(-1, 4),
+        'temp_c': np.array(temp_c),
+    }
+
+# The lines after the header, as loadColumns hands them on
+def body(data):
+    return imu.completeLines(data[data.find(b'\n') + 1:], 11)
+
+def assertSameColumns(columns, expected):
+    assert sorted(columns) == sorted(expected)
+    for name in expected:
+        assert columns[name].dtype == expected[name].dtype
+        np.testing.assert_array_equal(columns[name], expected[name])
+
+@pytest.mark.parametrize('filename', LOGS)
+def testBothPathsMatchParseFile(filename):
+    with open(filename, 'rb') as file:
+        data = file.read()
+    expected = parsedColumns(data)
+
+    # the logger's own files decode a word at a time, without falling back
+    lines = len(expected['tstamp'])
+    decoded = imu._emptyColumns(lines)
+    buf = np.frombuffer(body(data), dtype=np.uint8)
+    assert imu._decodeBlock(buf, 0, buf.size, decoded, 0) == lines
+    assertSameColumns(decoded, expected)
+    assertSameColumns(imu._parseBody(body(data)), expected)
+    assertSameColumns(imu._loadBody(body(data)), expected)
+    assertSameColumns(imu.loadColumns(io.BytesIO(data)), expected)
+
+def testSamplesOnTheSecond():
+    data = log(b'15:30:36.97', b'15:30:37', b'15:30:37.03')
+    expected = parsedColumns(data)
+    assert list(expected['tstamp']) == [55836970000, 55837000000,
+                                        55837030000]
+    assertSameColumns(imu._parseBody(body(data)), expected)
+    assertSameColumns(imu._loadBody(body(data)), expected)
+
+@pytest.mark.parametrize('timestamp', [
+    b'15:30:36.9', b'15:30:36.123456', b'00:00:00.00', b'23:59:59.99'])
+def testOtherFractionsFallBackToLoadtxt(timestamp):
+    data = log(b'15:30:36.97', timestamp)
+    expected = parsedColumns(data)
+    assertSameColumns(imu.loadColumns(io.BytesIO(data)), expected)
+    assertSameColumns(imu._loadBody(body(data)), expected)
+
+def testOtherNumbersFallBackToLoadtxt():
+    data = log(b'15:30:36.97', b'15:30:37.01').replace(b'0.036', b'3.6e-2')
+    expected = parsedColumns(data)
+    assert expected['gyro'][0, 0] == 0.036
+    assertSameColumns(imu.loadColumns(io.BytesIO(data)), expected)
+
+@pytest.mark.parametrize('timestamp', [
+    b'1:30:36.97', b'15:30:3a.97', b'15:3:36.97', b'15:30:36.', b'15:30:36.9x',
+    b'15:30:36.1234567', b'25:30:36.97', b'15:60:36.97', b'15:30:60.97',
+    b'15-30-36.97', b' 5:30:36.97', b'15:30:36:97', b''])
+def testMalformedTimestampsRaise(timestamp):
+    data = log(b'15:30:36.97', timestamp, b'15:30:37.01')
+    with pytest.raises(ValueError):
+        imu.loadColumns(io.BytesIO(data))
+    with pytest.raises(ValueError):
+        imu._loadBody(body(data))
+    with pytest.raises(ValueError):
+        imu.timestampsToMicroseconds(['15:30:36.97', timestamp])
+
+def testTimestampsToMicroseconds():
+    assert list(imu.timestampsToMicroseconds(
+        ['15:30:36.97', '15:30:36.9', '15:30:36', b'04:58:34',
+         '23:59:59.999999', '00:00:00.5'])) == [
+        55836970000, 55836900000, 55836000000, 17914000000,
+        86399999999, 500000]
+    assert imu.timestampsToMicroseconds([]).size == 0
+
+def testCalculateTimeDeltasAcrossMidnight():
+    (reference_time, average_time_delta, time_deltas,
+     cumulative_elapsed_times) = imu.calculateTimeDeltas(
+        ['23:59:59.90', '23:59:59.97', '00:00:00.01', '00:00:00.05'])
+    assert reference_time == 86399900000
+    np.testing.assert_allclose(time_deltas, [0, 0.07, 0.04, 0.04])
+    np.testing.assert_allclose(cumulative_elapsed_times,
+                               [0, 0.07, 0.11, 0.15])
+    assert average_time_delta == pytest.approx(0.15 / 4)
@@ -7,8 +7,15 @@ import pigpio
 import pynmea2
 import os
 import datetime
+import threading
+import queue
 from datetime import timedelta
-import RPi.GPIO as GPIO
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    # Off the Pi the reading and framing can still be run, e.g. against
+    # fake_pigpiod.py by bench_pigpio.py
+    GPIO = None
 
 # Serial pins for GPS
 RX = 23
@@ -18,64 +25,142 @@ EN = 24
 GPS_LED = 13
 GPS_Button = 11
 
-# Read data from the GPS
-def readFromGPS(pi, excess, buffer, bufferIndex, timestampBuffer):
-    (dataSize, data) = pi.bb_serial_read(RX)
-    if dataSize > 0:
-        allStr = excess + str(data)
-        excess = ''
-        senStartCount = allStr.count('$')
-
-        # This section should probably be made more robust:
-        # if the data is between 2 dollar signs is corrupted/missing it will 
-        # still be appended to the buffer; if this happens a lot we can waste 
-        # a lot of time unnecessarily flushing the buffer
-        if senStartCount > 1: # contains a whole sentence
-            sentStart = allStr.find('$')
-            sentEnd = allStr[sentStart+1:].find('$') - 1
-            excess = allStr[sentEnd+1:]
-            sentence = allStr[sentStart:sentEnd]
-            buffer.append(sentence)
-            bufferIndex += 1
-            sysTimestamp = str(datetime.datetime.now().time())[0:11]
-            timestampBuffer.append(sysTimestamp)
-        elif senStartCount == 1: # discard anything before start of sentence
-            sentStart = allStr.find('$')
-            excess = allStr[sentStart:]
-
-    return (excess, buffer, bufferIndex, timestampBuffer)
-
-# Clear out the buffer
-def flushBuffer(buffer, bufferIndex, timestampBuffer):
-    GPIO.output(GPS_LED, GPIO.LOW)
-    tsbi = 0
-    for sentence in buffer:
-        print(sentence)
+# NMEA sentences are at most 82 characters including the leading '$' and the
+# trailing <CR><LF>
+MAX_SENTENCE = 82
+
+# Longest the main loop goes without checking the button, in seconds. While
+# logging, the loop sleeps in the serial reader between sentences; otherwise
+# it just sleeps.
+BUTTON_POLL = 0.05
+
+# Splits the raw bytes coming off the bit-banged serial port into complete
+# NMEA sentences. Every '$...*hh\r\n' sentence in a read is returned, not just
+# the first, and anything that can't be part of a valid sentence is thrown
+# away straight away, so the buffer never holds more than one sentence's worth
+# of bytes however the GPS bursts its output.
+class NMEAFramer(object):
+    def __init__(self):
+        self.buffer = bytearray()
+        self.sentences = 0
+        self.badChecksums = 0
+        self.discardedBytes = 0
+
+    # Add newly received data and return a list of (timestamp, sentence) for
+    # each complete sentence with a valid checksum; timestamp is whatever the
+    # caller passes in as the receive time of this data
+    def feed(self, data, timestamp):
+        buffer = self.buffer
+        buffer.extend(data)
+        sentences = []
+        while True:
+            start = buffer.find(b'$')
+            if start < 0:
+                self._discard(len(buffer))
+                break
+            if start > 0:
+                self._discard(start)
+
+            end = buffer.find(b'\n')
+            restart = buffer.find(b'$', 1, end if end >= 0 else len(buffer))
+            if restart > 0:
+                # a new sentence started before this one finished
+                self._discard(restart)
+                continue
+            if end < 0:
+                if len(buffer) > MAX_SENTENCE:
+                    self._discard(len(buffer))
+                break
+
+            sentence = bytes(buffer[:end + 1])
+            del buffer[:end + 1]
+            if self._checksumValid(sentence):
+                self.sentences += 1
+                sentences.append((timestamp, sentence.rstrip(b'\r\n')))
+            else:
+                self.badChecksums += 1
+        return sentences
+
+    def _discard(self, count):
+        del self.buffer[:count]
+        self.discardedBytes += count
+
+    # checksum is the XOR of every byte between the '$' and the '*'
+    def _checksumValid(self, sentence):
+        body = sentence.rstrip(b'\r\n')
+        if len(body) < 4 or body[-3:-2] != b'*':
+            return False
+        checksum = 0
+        for byte in bytearray(body[1:-3]):
+            checksum ^= byte
         try:
-            msg = pynmea2.parse(sentence)
-            try:
-                GPSTime = str(msg.timestamp.strftime("%H:%M:%S"))
-            except:
-                GPSTime = '\t'
-            write = timestampBuffer[tsbi] + ",\t" + GPSTime + ",\t" +  str(msg.latitude) + ",\t" + str(msg.longitude) + ",\t" + str(msg.altitude) + "\n"
-            file.write(write)
-            file.flush()
-
-            # flash LED to indicate file is saving
-            GPIO.output(GPS_LED, GPIO.HIGH)
-            time.sleep(0.001)
-            GPIO.output(GPS_LED, GPIO.LOW)
-
-            tsbi += 1
+            return checksum == int(body[-2:], 16)
+        except ValueError:
+            return False
+
+# Read data from the GPS, waiting up to timeout seconds for some, returning a
+# list of (timestamp, sentence) for the sentences completed by this read
+def readFromGPS(reader, framer, timeout=None):
+    data = reader.read(timeout)
+    if len(data) > 0:
+        sysTimestamp = str(datetime.datetime.now().time())[0:11]
+        return [(timestamp, sentence.decode('ascii', 'replace'))
+                for (timestamp, sentence) in framer.feed(data, sysTimestamp)]
+    return []
+
+# Convert a sentence into a line of the GPS CSV log, or None if it doesn't
+# carry a position (only GGA sentences have latitude, longitude and altitude)
+def formatSentence(timestamp, sentence):
+    try:
+        msg = pynmea2.parse(sentence)
+        try:
+            GPSTime = str(msg.timestamp.strftime("%H:%M:%S"))
         except:
-            print("unable to parse sentence: " + sentence)
-            GPIO.output(GPS_LED, GPIO.LOW)
-    
-    GPIO.output(GPS_LED, GPIO.LOW)
-    return ([], 0, [])
+            GPSTime = '\t'
+        return timestamp + ",\t" + GPSTime + ",\t" +  str(msg.latitude) + ",\t" + str(msg.longitude) + ",\t" + str(msg.altitude) + "\n"
+    except:
+        return None
+
+# Parses sentences into the CSV log on a worker thread, so the acquisition
+# loop never waits on pynmea2 or the SD card. The raw sentences are already
+# on disk by the time they get here, so the CSV can also be rebuilt later with
+# gps_log_tools.convertRawLog.
+class ParseWorker(object):
+    def __init__(self, file):
+        self.file = file
+        self.parsed = 0
+        self.unparsed = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, timestamp, sentence):
+        self._queue.put((timestamp, sentence))
+
+    # Parse whatever is queued and stop the worker thread
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            line = formatSentence(item[0], item[1])
+            if line is None:
+                self.unparsed += 1
+            else:
+                self.file.write(line)
+                self.parsed += 1
+            # write out in batches, whenever the queue has been drained
+            if self._queue.empty():
+                self.file.flush()
+        self.file.flush()
 
 # Initialise the GPS module and prepare for file logging
-def init(pi, file):
+def init(pi, file, rawFile):
     # Initialize serial emulation library
     pi = pigpio.pi()
     pi.set_mode(RX, pigpio.INPUT)
@@ -97,6 +182,10 @@ def init(pi, file):
     if os.stat(filename).st_size == 0:
         file.write("System_Timestamp,\tGPS_Timestamp\tLatitude,\tLongitude,\tAltitude\n")
 
+    # Every sentence is also logged unparsed, in the form
+    # System_Timestamp,<tab>$sentence*hh
+    rawFile = open("/home/pi/GPS/log_gps_raw_" + refTime + ".txt", "a")
+
     GPIO.setmode(GPIO.BOARD)       # Numbers GPIOs by physical location
     GPIO.setup(GPS_LED, GPIO.OUT)   # Set GPS_LEDPin's mode to output
     GPIO.setup(GPS_Button, GPIO.IN, pull_up_down=GPIO.PUD_UP) # Set GPS_ButtonPin's mode as input
@@ -110,7 +199,7 @@ def init(pi, file):
     time.sleep(0.1)
     GPIO.output(GPS_LED, 0)
     
-    return (pi, file)
+    return (pi, file, rawFile)
 
 # If something fails flash SOS in morse
 def failstate():
@@ -143,18 +232,17 @@ def destroy():
         print("failed to stop pigpio")
 
 # main logging loop
-def core(pi, file):
+def core(pi, file, rawFile):
     GPS_Pressed = False
     GPS_Enabled = False
     GPS_Prev = False
     GPS_Curr = False
 
-    buffer = [] # buffer for separated sentences (in raw format)
-    bufferSize = 60 # buffer size of 60 gives 1 minute of data when sensor is operating at 1 hz
-    bufferIndex = 0 # position in buffer
-    excess = '' # used for storing imcomplete sentences between cycles
-
-    timestampBuffer = []
+    bufferSize = 60 # flush the raw log every 60 sentences, roughly 10 seconds of data at 1 hz
+    bufferIndex = 0 # sentences since the last flush
+    framer = NMEAFramer() # holds incomplete sentences between cycles
+    parser = ParseWorker(file)
+    reader = pi.bb_serial_reader(RX) # waits for data instead of spinning
 
     try:
         # main loop
@@ -172,17 +260,25 @@ def core(pi, file):
                 GPS_Enabled = not GPS_Enabled # Toggle GPS logging
             
             if GPS_Enabled:
-                # Turn on LED, read data from GPS and flush buffer as required
+                # Turn on LED, read data from GPS and log it raw straight
+                # away; parsing happens on the worker thread
                 GPIO.output(GPS_LED, GPIO.HIGH)
-                (excess, buffer, bufferIndex, timestampBuffer) = readFromGPS(pi, excess, buffer, bufferIndex, timestampBuffer)
-                if bufferIndex == bufferSize:
-                    (buffer, bufferIndex, timestampBuffer) = flushBuffer(buffer, bufferIndex, timestampBuffer)
-            # gps has just been disabled, flush the buffer
+                for (timestamp, sentence) in readFromGPS(reader, framer,
+                                                         BUTTON_POLL):
+                    rawFile.write(timestamp + ",\t" + sentence + "\n")
+                    parser.put(timestamp, sentence)
+                    bufferIndex += 1
+                if bufferIndex >= bufferSize:
+                    rawFile.flush()
+                    bufferIndex = 0
+            # gps has just been disabled, flush the raw log
             elif not GPS_Enabled and GPS_Prev:
                 GPIO.output(GPS_LED, GPIO.LOW)
-                (buffer, bufferIndex, timestampBuffer) = flushBuffer(buffer, bufferIndex, timestampBuffer)
+                rawFile.flush()
+                bufferIndex = 0
             else:
                 GPIO.output(GPS_LED, GPIO.LOW)
+                time.sleep(BUTTON_POLL)
 
     except Exception as e:
         print(e)
@@ -190,16 +286,20 @@ def core(pi, file):
         pi.stop()
         destroy()
         failstate()
+    finally:
+        rawFile.flush()
+        parser.close()
 
 if __name__ == '__main__':     # Program start from here
     try:
         try:
             pi = None
             file = None
+            rawFile = None
             print("Initializing")
-            (pi, file) = init(pi, file)
+            (pi, file, rawFile) = init(pi, file, rawFile)
             print("initialisation complete\nEntering core")
-            core(pi, file)
+            core(pi, file, rawFile)
         except Exception as e:
             print(e)
     except KeyboardInterrupt:  # When 'Ctrl+C' is pressed, the child program destroy() will be executed
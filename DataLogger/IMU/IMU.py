@@ -4,48 +4,89 @@ import sys
 import time
 import os
 import datetime
+import struct
+import threading
+import queue
 import RPi.GPIO as rpi_GPIO
 import Adafruit_GPIO as GPIO
 from Adafruit_BNO055 import BNO055
+from Adafruit_BNO055 import sampler
 
 # pin decs
 IMU_LED = 6 #BCM
 IMU_Button = 5 #BCM
 
-def readFromIMU(bno, buffer, bufferIndex):
-    gx, gy, gz = bno.read_gyroscope()
-    GyrStr = '{0:0.3F},\t{1:0.3F},\t{2:0.3F}'.format(
-          gx, gy, gz)
-    # Linear acceleration data (i.e. acceleration from movement, not gravity--
-    # returned in meters per second squared):
-    ax, ay, az = bno.read_linear_acceleration()
-    AccStr = '{0:0.3F},\t{1:0.3F},\t{2:0.3F}'.format(
-          ax, ay, az)
-    # Orientation as a quaternion:
-    dx, dy, dz, w = bno.read_quaternion()
-    DirStr = '{0:0.3F},\t{1:0.3F},\t{2:0.3F},\t{3:0.3F}'.format(
-          dx, dy, dz, w)
-    # Sensor temperature in degrees Celsius:
-    temp_c = bno.read_temp()
-    TemStr = '{0:0.2F}'.format(
-          temp_c)
-
-    combStr = str(datetime.datetime.now().time())[0:11] + ',\t' + GyrStr + \
-                  ',\t' + AccStr + ',\t' + DirStr + ',\t' + TemStr + '\n'
-    print(combStr)
-    buffer.append(combStr)
-
-    return (buffer, (bufferIndex+1))
-
-# flush
-def flushBuffer(buffer, bufferIndex, file):
-    gpio.output(IMU_LED, 0)
-    for line in buffer:
-        file.write(line)
-        gpio.output(IMU_LED, 1)
-        file.flush()
-        gpio.output(IMU_LED, 0)
-    return ([], 0)
+# Binary log format (read back by DataAnalysis/imu_log_tools.py)
+# The file starts with a header:
+#   magic b'IMUB', format version, record size,
+#   wall clock time (ns since epoch) and monotonic time (ns) at start
+# followed by fixed-width little-endian records:
+#   monotonic time (ns),
+#   gyro_x, y, z, acc_x, y, z, quat_x, y, z, w, temp_c (float32)
+LOG_MAGIC = b'IMUB'
+LOG_VERSION = 1
+LOG_HEADER = struct.Struct('<4sHHqq')
+# Records are written to the file straight out of the sampler's ring buffer,
+# so the log uses the sampler's record layout
+LOG_RECORD = sampler.RECORD
+
+# Sampling rate (Hz), how many samples to gather per write, and how often the
+# core loop checks the button (s)
+SAMPLE_RATE = 100
+WRITE_SAMPLES = 100
+POLL_INTERVAL = 0.05
+
+# Writes samples to the log file from a background thread, so neither the
+# sampler nor the core loop ever waits on the SD card. Each write is handed a
+# copy of the records taken out of the sampler's ring buffer, so a stalled
+# card can't let the sampler overwrite records that are still queued. Samples
+# the ring overwrote before they could be copied are counted in
+# droppedSamples.
+class LogWriter(object):
+    def __init__(self, file, fsyncInterval=5.0):
+        self.file = file
+        self.fsyncInterval = fsyncInterval
+
+        self.droppedSamples = 0
+        self.samplesWritten = 0
+        self.writes = 0
+        self.maxWriteTime = 0.0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # Queue the records returned by Sampler.read for writing
+    def write(self, data, lost=0):
+        self.droppedSamples += lost
+        if data:
+            self._queue.put(data)
+
+    # Write out whatever is queued and stop the writer thread
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        lastSync = time.monotonic()
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+
+            start = time.monotonic()
+            self.file.write(data)
+            self.samplesWritten += len(data) // LOG_RECORD.size
+            self.file.flush()
+            if start - lastSync >= self.fsyncInterval:
+                os.fsync(self.file.fileno())
+                lastSync = start
+            self.maxWriteTime = max(self.maxWriteTime, time.monotonic() - start)
+            self.writes += 1
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
 
 # init
 def init(bno, file, gpio):
@@ -57,10 +98,11 @@ def init(bno, file, gpio):
 
     # Create the logging file
     refTime = str(datetime.datetime.now().time())[0:11]
-    filename = "/home/pi/IMU/log_imu_" + refTime  + ".csv"
-    file = open(filename, "a")
+    filename = "/home/pi/IMU/log_imu_" + refTime  + ".bin"
+    file = open(filename, "ab")
     if os.stat(filename).st_size == 0:
-        file.write("Timestamp,\tGyro_x,\tGyro_y,\tGyro_z,\tAcc_x,\tAcc_y,\tAcc_z,\tOrie_x,\tOrie_y,\tOrie_z,\tOrie_w,\tTemp_C\n")
+        file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, LOG_RECORD.size,
+                                   time.time_ns(), time.monotonic_ns()))
         print('IMU logging file created')
     print('IMU logging file opened')
     
@@ -117,9 +159,10 @@ def core(bno, file, gpio):
     IMU_Prev = False
     IMU_Curr = False
 
-    buffer = []
-    bufferSize = 100
-    bufferIndex = 0
+    # ring buffer holds about 40 s of samples, in case the SD card stalls
+    imuSampler = sampler.Sampler(bno, rate=SAMPLE_RATE, capacity=4096)
+    writer = LogWriter(file)
+    position = 0
 
     try:
         while True:
@@ -134,17 +177,38 @@ def core(bno, file, gpio):
 
             if IMU_Enabled:
                 gpio.output(IMU_LED, 1)
-                (buffer, bufferIndex) = readFromIMU(bno, buffer, bufferIndex)
-                if bufferIndex == bufferSize:
-                    (buffer, bufferIndex) = flushBuffer(buffer, bufferIndex, file)
+                if not IMU_Prev:
+                    position = imuSampler.buffer.count
+                    imuSampler.start()
+                # read also raises if the sampler has failed
+                if (imuSampler.buffer.count - position >= WRITE_SAMPLES or
+                        imuSampler.error is not None):
+                    (data, position, lost) = imuSampler.read(position)
+                    writer.write(data, lost)
             elif not IMU_Enabled and IMU_Prev:
                 gpio.output(IMU_LED, 0)
-                (buffer, bufferIndex) = flushBuffer(buffer, bufferIndex, file)
+                imuSampler.stop()
+                (data, position, lost) = imuSampler.read(position)
+                writer.write(data, lost)
+                stats = imuSampler.get_stats()
+                print('Samples: {0}, dropped: {1}, missed deadlines: {2}, overruns: {3}, max jitter: {4:0.4f} s'.format(
+                      stats['samples'], writer.droppedSamples, stats['missed_deadlines'],
+                      stats['overruns'], stats['max_jitter']))
             else:
                 gpio.output(IMU_LED, 0)
+
+            # sampling happens in the sampler's thread, so the button only
+            # needs checking every so often
+            time.sleep(POLL_INTERVAL)
     except Exception as e:
         print(e)
         failstate()
+    finally:
+        # keep whatever was sampled before a failure
+        imuSampler.stop()
+        (data, position, lost) = imuSampler.buffer.read_bytes(position)
+        writer.write(data, lost)
+        writer.close()
 
 # main
 if __name__ == '__main__':     # Program start from here
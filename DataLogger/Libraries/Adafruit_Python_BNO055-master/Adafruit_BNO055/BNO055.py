@@ -206,6 +206,26 @@ OPERATION_MODE_M4G                   = 0X0A
 OPERATION_MODE_NDOF_FMC_OFF          = 0X0B
 OPERATION_MODE_NDOF                  = 0X0C
 
+# Burst read covering everything from the gyro data registers through to the
+# temperature register, so one transaction returns a full sample:
+#   gyro x, y, z          (0x14 - 0x19)
+#   euler h, r, p         (0x1A - 0x1F, skipped)
+#   quaternion w, x, y, z (0x20 - 0x27)
+#   linear accel x, y, z  (0x28 - 0x2D)
+#   gravity x, y, z       (0x2E - 0x33, skipped)
+#   temperature           (0x34)
+BNO055_BLOCK_START_ADDR              = BNO055_GYRO_DATA_X_LSB_ADDR
+BNO055_BLOCK_LENGTH                  = BNO055_TEMP_ADDR - BNO055_BLOCK_START_ADDR + 1
+BNO055_BLOCK_FORMAT                  = struct.Struct('<3h6x4h3h6xb')
+# SMBus block reads are limited to 32 bytes, so over I2C the block is read in
+# pieces of at most this size.
+BNO055_I2C_BLOCK_LIMIT               = 32
+
+# Precompiled little-endian signed 16-bit vector formats for _read_vector,
+# keyed by the number of values.
+_VECTOR_FORMATS = dict((count, struct.Struct('<{0}h'.format(count)))
+                       for count in (1, 2, 3, 4))
+
 
 logger = logging.getLogger(__name__)
 
@@ -630,13 +650,10 @@ class BNO055(object):
     def _read_vector(self, address, count=3):
         # Read count number of 16-bit signed values starting from the provided
         # address. Returns a tuple of the values that were read.
-        data = self._read_bytes(address, count*2)
-        result = [0]*count
-        for i in range(count):
-            result[i] = ((data[i*2+1] << 8) | data[i*2]) & 0xFFFF
-            if result[i] > 32767:
-                result[i] -= 65536
-        return result
+        vector_format = _VECTOR_FORMATS.get(count)
+        if vector_format is None:
+            vector_format = struct.Struct('<{0}h'.format(count))
+        return vector_format.unpack(self._read_bytes(address, count*2))
 
     def read_euler(self):
         """Return the current absolute orientation as a tuple of heading, roll,
@@ -692,3 +709,38 @@ class BNO055(object):
     def read_temp(self):
         """Return the current temperature in Celsius."""
         return self._read_signed_byte(BNO055_TEMP_ADDR)
+
+    def read_block(self):
+        """Return the raw bytes of the contiguous register block from the
+        gyroscope data registers through to the temperature register, read in
+        a single transaction over serial.  The block is longer than an SMBus
+        block read allows, so over I2C it takes two transactions.  See read_all
+        for a decoded version.
+        """
+        if self._i2c_device is None:
+            return self._read_bytes(BNO055_BLOCK_START_ADDR, BNO055_BLOCK_LENGTH)
+        block = bytearray()
+        for offset in range(0, BNO055_BLOCK_LENGTH, BNO055_I2C_BLOCK_LIMIT):
+            length = min(BNO055_I2C_BLOCK_LIMIT, BNO055_BLOCK_LENGTH - offset)
+            block.extend(self._read_bytes(BNO055_BLOCK_START_ADDR + offset,
+                                          length))
+        return block
+
+    def read_all(self):
+        """Return the gyroscope, linear acceleration, quaternion and temperature
+        readings from a single burst read, as a tuple of:
+          - gyroscope X, Y, Z tuple in degrees per second
+          - linear acceleration X, Y, Z tuple in meters/second^2
+          - quaternion X, Y, Z, W tuple
+          - temperature in Celsius
+        Each value is scaled the same way as the matching read_* function, but
+        only one serial transaction (two over I2C) is made instead of four.
+        """
+        (gx, gy, gz, qw, qx, qy, qz, ax, ay, az,
+         temp) = BNO055_BLOCK_FORMAT.unpack(self.read_block())
+        # Scale values, see 3.6.5.5 in the datasheet.
+        scale = (1.0 / (1<<14))
+        return ((gx/900.0, gy/900.0, gz/900.0),
+                (ax/100.0, ay/100.0, az/100.0),
+                (qx*scale, qy*scale, qz*scale, qw*scale),
+                temp)
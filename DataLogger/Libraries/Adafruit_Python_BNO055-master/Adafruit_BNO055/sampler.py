@@ -0,0 +1,216 @@
+# Fixed-rate BNO055 sampler with a preallocated ring buffer.
+#
+# The sampler reads the sensor from its own thread on a deadline based
+# schedule (rather than as fast as the bus allows), and stores each sample as
+# a fixed-width binary record.  Consumers such as a data logger or a control
+# loop read from the shared ring buffer without copying.
+import struct
+import threading
+import time
+
+
+# One sample: monotonic timestamp in nanoseconds, gyroscope X, Y, Z, linear
+# acceleration X, Y, Z, quaternion X, Y, Z, W and temperature, little-endian.
+RECORD = struct.Struct('<q3f3f4ff')
+
+
+class RingBuffer(object):
+    """Fixed capacity buffer of samples backed by a single preallocated
+    bytearray.  One writer appends samples; readers keep track of their own
+    position (a previous value of count) and read from there.
+    """
+
+    def __init__(self, capacity, record=RECORD):
+        self.capacity = capacity
+        self.record = record
+        self.data = bytearray(capacity * record.size)
+        self._view = memoryview(self.data)
+        # Total number of samples ever appended.  The next sample goes into
+        # slot count % capacity.
+        self.count = 0
+
+    def append(self, *values):
+        """Pack a sample into the next slot, overwriting the oldest sample once
+        the buffer is full.
+        """
+        offset = (self.count % self.capacity) * self.record.size
+        self.record.pack_into(self.data, offset, *values)
+        self.count += 1
+
+    def latest(self):
+        """Return the most recent sample as a tuple, or None if no samples have
+        been taken yet.
+        """
+        count = self.count
+        if count == 0:
+            return None
+        offset = ((count - 1) % self.capacity) * self.record.size
+        return self.record.unpack_from(self.data, offset)
+
+    def read(self, position):
+        """Return the samples appended since position as a tuple of:
+          - a list of zero, one or two memoryviews over the raw records, in
+            order (two when the samples wrap around the end of the buffer)
+          - the new position to pass in next time
+          - the number of samples that were overwritten before being read
+        Nothing is copied, so the views are only valid until the writer wraps
+        around onto them again.  At most capacity - 1 samples are returned,
+        so the slot the writer fills next is never among them.
+        """
+        count = self.count
+        lost = 0
+        if count - position > self.capacity - 1:
+            lost = count - (self.capacity - 1) - position
+            position = count - (self.capacity - 1)
+        size = self.record.size
+        start = position % self.capacity
+        end = start + (count - position)
+        if start == end:
+            segments = []
+        elif end <= self.capacity:
+            segments = [self._view[start*size:end*size]]
+        else:
+            segments = [self._view[start*size:],
+                        self._view[:(end - self.capacity)*size]]
+        return (segments, count, lost)
+
+    def read_bytes(self, position):
+        """Like read, but return a copy of the samples as a single bytes object
+        instead of views, so they can be held on to.  Samples the writer came
+        round to while they were being copied are dropped from the front of
+        the copy and counted as lost.
+        """
+        (segments, count, lost) = self.read(position)
+        data = b''.join(segments)
+        size = self.record.size
+        start = count - len(data) // size
+        # the writer may be part way through the slot of sample
+        # self.count - capacity, so anything up to and including it is suspect
+        overwritten = self.count - self.capacity + 1 - start
+        if overwritten > 0:
+            overwritten = min(overwritten, len(data) // size)
+            data = data[overwritten*size:]
+            lost += overwritten
+        return (data, count, lost)
+
+
+class Sampler(object):
+    """Read gyroscope, linear acceleration, quaternion and temperature from a
+    BNO055 at a fixed rate (in Hz) into a RingBuffer, from a background
+    thread.  The schedule is anchored to time.monotonic_ns so it doesn't drift
+    with CPU load; if a read runs late, the deadlines that were missed are
+    skipped rather than bursting to catch up.
+
+    If reading the sensor fails, the thread stops and the exception is raised
+    again from wait and read, so callers don't wait forever for samples that
+    will never come.
+    """
+
+    def __init__(self, bno, rate=100, capacity=1024):
+        self._bno = bno
+        self.period_ns = int(1e9 / rate)
+        self.buffer = RingBuffer(capacity)
+        # Timing statistics:
+        #  - overruns: reads that took longer than one period
+        #  - missed_deadlines: scheduled samples that were skipped entirely
+        #  - jitter: how late each read started after its deadline
+        self.overruns = 0
+        self.missed_deadlines = 0
+        self.max_jitter_ns = 0
+        self._total_jitter_ns = 0
+        self._new_sample = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        # The exception that stopped the sampling thread, if any
+        self.error = None
+
+    def start(self):
+        """Start sampling in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.error = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the background thread to finish."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def wait(self, position, timeout=None):
+        """Block until a sample newer than position (a previous value of
+        buffer.count) is available, and return the current buffer.count.
+        Raises the exception that stopped sampling, if there was one.
+        """
+        with self._new_sample:
+            self._new_sample.wait_for(
+                lambda: self.buffer.count > position or self.error is not None,
+                timeout)
+        self._check()
+        return self.buffer.count
+
+    def read(self, position):
+        """Return a copy of the samples taken since position, as returned by
+        RingBuffer.read_bytes.  Raises the exception that stopped sampling, if
+        there was one.
+        """
+        self._check()
+        return self.buffer.read_bytes(position)
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError('BNO055 sampling stopped: {0}'.format(
+                self.error)) from self.error
+
+    def get_stats(self):
+        """Return a dict of sample count and timing statistics, with jitter in
+        seconds.
+        """
+        samples = self.buffer.count
+        mean_jitter = self._total_jitter_ns / samples if samples else 0
+        return {'samples': samples,
+                'overruns': self.overruns,
+                'missed_deadlines': self.missed_deadlines,
+                'mean_jitter': mean_jitter / 1e9,
+                'max_jitter': self.max_jitter_ns / 1e9}
+
+    def _run(self):
+        period = self.period_ns
+        deadline = time.monotonic_ns()
+        while not self._stop.is_set():
+            now = time.monotonic_ns()
+            if now < deadline:
+                # Sleep on the stop event so stop() doesn't wait a period.
+                self._stop.wait((deadline - now) / 1e9)
+                continue
+            jitter = now - deadline
+            self._total_jitter_ns += jitter
+            if jitter > self.max_jitter_ns:
+                self.max_jitter_ns = jitter
+
+            try:
+                gyro, accel, quat, temp = self._bno.read_all()
+            except Exception as e:
+                self.error = e
+                with self._new_sample:
+                    self._new_sample.notify_all()
+                return
+            self.buffer.append(now, *(gyro + accel + quat + (temp,)))
+            with self._new_sample:
+                self._new_sample.notify_all()
+
+            finished = time.monotonic_ns()
+            if finished - now > period:
+                self.overruns += 1
+            # Take the next sample at the latest deadline that has already
+            # passed, dropping any before it.
+            deadline += period
+            missed = (finished - deadline) // period
+            if missed > 0:
+                self.missed_deadlines += missed
+                deadline += missed * period
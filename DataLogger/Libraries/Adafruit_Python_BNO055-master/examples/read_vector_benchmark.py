@@ -0,0 +1,33 @@
+# Micro-benchmark comparing the old list based 16-bit vector decode with the
+# precompiled struct decode now used by BNO055._read_vector.  No sensor is
+# needed; both versions decode the same in-memory buffers.
+import random
+import struct
+import timeit
+
+from Adafruit_BNO055 import BNO055
+
+
+def decode_with_list(data, count):
+    # The per-element shift, mask and sign fix _read_vector used to do.
+    result = [0]*count
+    for i in range(count):
+        result[i] = ((data[i*2+1] << 8) | data[i*2]) & 0xFFFF
+        if result[i] > 32767:
+            result[i] -= 65536
+    return result
+
+def decode_with_struct(data, count):
+    return BNO055._VECTOR_FORMATS[count].unpack(data)
+
+
+iterations = 200000
+for count in (3, 4):
+    data = bytearray(random.getrandbits(8) for i in range(count*2))
+    assert list(decode_with_struct(data, count)) == decode_with_list(data, count)
+    old = min(timeit.repeat(lambda: decode_with_list(data, count),
+                            number=iterations, repeat=5))
+    new = min(timeit.repeat(lambda: decode_with_struct(data, count),
+                            number=iterations, repeat=5))
+    print('{0} values: list {1:0.3f} us, struct {2:0.3f} us, {3:0.1f}x faster'.format(
+          count, old / iterations * 1e6, new / iterations * 1e6, old / new))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+# Benchmarks for the pigpio Python module.
+#
+# bench_pigpio.py [local] [--latency SECONDS] [--capture FILE] [benchmark ...]
+#
+# By default the benchmarks run against the pigpio daemon given by
+# PIGPIO_ADDR/PIGPIO_PORT.  With "local" they run against
+# fake_pigpiod.py, started in a child process on a free port, with
+# latency seconds added to each reply and the given NMEA capture fed to
+# the GPS's bit bang serial GPIO.  Only the Python side is measured
+# then, so use a real daemon for meaningful absolute numbers.
+#
+# The benchmarks only write to GPIO 25 (pin 22), as x_pigpio.py does,
+# and read the GPS on GPIO 23 as GPS.py does.
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+import pigpio
+import fake_pigpiod
+
+GPIO=25
+
+# The PWM frequency used to flood notifications from the fake daemon,
+# which reports edges as fast as they can be taken.
+FLOOD_FREQUENCY = 10000000
+
+sys.path.insert(0, os.path.join(
+   os.path.dirname(os.path.abspath(__file__)), "..", "..", "GPS"))
+
+def rate(count, seconds):
+   return "{:.0f}/s".format(count / seconds)
+
+# Round trip latencies, in seconds, the local daemon is given when
+# comparing batched commands with lockstep ones.
+BATCH_LATENCIES = (0.0, 0.0002, 0.001)
+
+def _batch_times(pi, count):
+   """Seconds for count writes in lockstep, then in a batch."""
+
+   start = time.time()
+   for i in range(count):
+      pi.write(GPIO, i & 1)
+   lockstep = time.time() - start
+
+   start = time.time()
+   with pi.batch() as b:
+      for i in range(count):
+         b.write(GPIO, i & 1)
+   batched = time.time() - start
+   return lockstep, batched
+
+def bench_batch(pi, count=10000, local=None):
+   """
+   Lockstep commands against the same commands in a batch and, with
+   the local daemon, against daemons with each of BATCH_LATENCIES
+   added to every round trip.
+   """
+
+   runs = [("", pi, count)]
+   daemons = []
+   if local is not None:
+      for latency in BATCH_LATENCIES:
+         daemon, port = fake_pigpiod.spawn(**dict(local, latency=latency))
+         daemons.append(daemon)
+         # Lockstep commands each wait out the latency, so fewer do.
+         runs.append((" at {:.1f} ms".format(1e3 * latency),
+                      pigpio.pi('localhost', port),
+                      count if latency == 0 else min(count, 1000)))
+
+   for name, p, n in runs:
+      lockstep, batched = _batch_times(p, n)
+      print("write x{}{}: lockstep {}, batch {} ({:.1f}x)".format(
+         n, name, rate(n, lockstep), rate(n, batched), lockstep / batched))
+
+   for name, p, n in runs[1:]:
+      p.stop()
+   for daemon in daemons:
+      daemon.terminate()
+
+def bench_lockstep(pi, count=10000):
+   """Lockstep commands per second on one socket, and their latency."""
+
+   latencies = []
+   start = time.time()
+   for i in range(count):
+      t = time.time()
+      pi.read(GPIO)
+      latencies.append(time.time() - t)
+   elapsed = time.time() - start
+
+   latencies.sort()
+   print("read x{}: {}, median {:.3f} ms, 99% {:.3f} ms".format(
+      count, rate(count, elapsed), 1e3 * latencies[len(latencies) // 2],
+      1e3 * latencies[int(len(latencies) * 0.99)]))
+
+def _ingest(pi, seconds):
+   """
+   Reads the GPS as GPS.py does for a number of seconds, returning
+   (sentences, bytes, elapsed, CPU seconds).
+   """
+   import GPS
+
+   pi.bb_serial_read_open(GPS.RX, 9600, 8)
+   reader = pi.bb_serial_reader(GPS.RX)
+   framer = GPS.NMEAFramer()
+   sentences = 0
+   start = time.time()
+   cpu = time.process_time()
+   while time.time() - start < seconds:
+      sentences += len(GPS.readFromGPS(reader, framer, GPS.BUTTON_POLL))
+   elapsed = time.time() - start
+   cpu = time.process_time() - cpu
+   pi.bb_serial_read_close(GPS.RX)
+   return sentences, reader.bytes, elapsed, cpu
+
+def bench_gps(pi, seconds=5.0, local=None):
+   """
+   GPS ingest through the streaming reader and NMEA framing: the CPU
+   it costs at 9600 baud and, against the local daemon (whose spawn
+   options are local), how fast it can go when the serial data never
+   runs dry.
+   """
+
+   sentences, count, elapsed, cpu = _ingest(pi, seconds)
+   print("GPS at 9600 baud: sentences {}, bytes {}, {:.1f}% CPU".format(
+      rate(sentences, elapsed), rate(count, elapsed), 100 * cpu / elapsed))
+
+   if local is not None:
+      options = dict(local, serial_speed=None)
+      daemon, port = fake_pigpiod.spawn(**options)
+      p = pigpio.pi('localhost', port)
+      sentences, count, elapsed, cpu = _ingest(p, seconds)
+      p.stop()
+      daemon.terminate()
+      print("GPS flat out: sentences {}, bytes {}".format(
+         rate(sentences, elapsed), rate(count, elapsed)))
+
+def bench_notify(pi, seconds=3.0, others=8, local=None):
+   """
+   Edge callbacks delivered per second by the notification thread,
+   with callbacks also registered on a number of other, quiet, GPIO.
+   local is None against a real daemon.
+   """
+
+   quiet = [pi.callback(g, pigpio.EITHER_EDGE)
+            for g in range(GPIO - others, GPIO)]
+
+   # 8000 Hz PWM gives 16000 edges a second.
+   pi.set_PWM_frequency(
+      GPIO, 8000 if local is None else FLOOD_FREQUENCY)
+   pi.set_PWM_dutycycle(GPIO, 128)
+   cb = pi.callback(GPIO, pigpio.EITHER_EDGE)
+
+   time.sleep(0.5)
+   cb.reset_tally()
+   start = time.time()
+   cpu = time.process_time()
+   time.sleep(seconds)
+   count = cb.tally()
+   elapsed = time.time() - start
+   cpu = time.process_time() - cpu
+   cb.cancel()
+   for q in quiet:
+      q.cancel()
+
+   pi.set_PWM_dutycycle(GPIO, 0)
+
+   print("notify ({} quiet callbacks): {} callbacks, {:.0f}% CPU".format(
+      others, rate(count, elapsed), 100 * cpu / elapsed))
+
+def _hammer(p, threads, count):
+   """Runs count writes in each of a number of threads on pi p."""
+   def worker():
+      for i in range(count):
+         p.write(GPIO, i & 1)
+   workers = [threading.Thread(target=worker) for t in range(threads)]
+   start = time.time()
+   for w in workers:
+      w.start()
+   for w in workers:
+      w.join()
+   return time.time() - start
+
+def bench_pool(pi, threads=4, count=5000):
+   """
+   Command throughput of several threads sharing one command socket,
+   against a pool of sockets with each kind of checkout.
+   """
+
+   configs = [
+      ("shared socket", {}),
+      ("pool of 1", {"command_sockets": 1}),
+      ("pool, per thread", {"command_sockets": threads,
+                            "checkout": pigpio.CHECKOUT_THREAD}),
+      ("pool, round robin", {"command_sockets": threads,
+                             "checkout": pigpio.CHECKOUT_ROUND_ROBIN}),
+   ]
+
+   for name, kwargs in configs:
+      p = pigpio.pi(pi._host, pi._port, **kwargs)
+      elapsed = _hammer(p, threads, count)
+      stats = p.get_command_stats()
+      p.stop()
+      line = "{} threads, {}: {}".format(
+         threads, name, rate(threads * count, elapsed))
+      if stats is not None:
+         line += ", {} of {} checkouts waited, {:.3f}s waiting".format(
+            stats["contended"], stats["acquires"], stats["wait_time"])
+      print(line)
+
+def bench_wait(pi, count=200, event=7):
+   """
+   Latency from triggering an event to wait_for_event returning.
+   """
+
+   latencies = []
+   for i in range(count):
+      def trigger():
+         time.sleep(0.002)
+         triggered.append(time.time())
+         pi.event_trigger(event)
+      triggered = []
+      t = threading.Thread(target=trigger)
+      t.start()
+      if pi.wait_for_event(event, 1.0):
+         latencies.append(time.time() - triggered[0])
+      t.join()
+
+   latencies.sort()
+   print("wait_for_event x{}: median {:.3f} ms, max {:.3f} ms, {} missed".format(
+      count, 1e3 * latencies[len(latencies) // 2], 1e3 * latencies[-1],
+      count - len(latencies)))
+
+def _scanned_error_text(errnum):
+   """error_text the way pigpio did before its lookup table."""
+   for e in pigpio._errors:
+      if e[0] == errnum:
+         return e[1]
+   return "unknown error ({})".format(errnum)
+
+def _best(function, count, repeats):
+   """The best of a number of timings of count calls, per call."""
+   best = None
+   for r in range(repeats):
+      start = time.time()
+      for i in range(count):
+         function(i)
+      elapsed = (time.time() - start) / count
+      if best is None or elapsed < best:
+         best = elapsed
+   return best
+
+def bench_error_text(pi, count=5000, repeats=5):
+   """
+   error_text's lookup table against a scan of the error list.  The
+   best of several runs is taken to keep scheduling noise out.
+   """
+
+   errors = [e[0] for e in pigpio._errors]
+   old = _best(lambda i: _scanned_error_text(errors[i % len(errors)]),
+      count, repeats)
+   new = _best(lambda i: pigpio.error_text(errors[i % len(errors)]),
+      count, repeats)
+   print("error_text: scan {:.2f} us, table {:.2f} us".format(
+      1e6 * old, 1e6 * new))
+
+# Benchmarks given the local daemon's spawn options, to start more of
+# their own.
+LOCAL_BENCHMARKS = ("batch", "gps", "notify")
+
+BENCHMARKS = {
+   "batch": bench_batch,
+   "error_text": bench_error_text,
+   "lockstep": bench_lockstep,
+   "gps": bench_gps,
+   "notify": bench_notify,
+   "pool": bench_pool,
+   "wait": bench_wait,
+}
+
+if __name__ == "__main__":
+
+   parser = argparse.ArgumentParser(
+      description="Benchmarks for the pigpio Python module.")
+   parser.add_argument("benchmarks", nargs="*",
+                       help="[local] followed by any of " +
+                       ", ".join(sorted(BENCHMARKS)))
+   parser.add_argument("--latency", type=float, default=0.0,
+                       help="seconds the local daemon adds to each reply")
+   parser.add_argument("--capture",
+                       help="NMEA capture the local daemon feeds the GPS")
+   args = parser.parse_intermixed_args()
+
+   names = args.benchmarks
+   daemon = None
+   local = None
+   if names[:1] == ["local"]:
+      names = names[1:]
+      local = {"latency": args.latency}
+      if args.capture:
+         local["capture"] = fake_pigpiod.load_capture(args.capture)
+      daemon, port = fake_pigpiod.spawn(**local)
+      pi = pigpio.pi('localhost', port)
+   else:
+      pi = pigpio.pi()
+
+   if not pi.connected:
+      exit()
+
+   for name in names or sorted(BENCHMARKS):
+      if name in LOCAL_BENCHMARKS:
+         BENCHMARKS[name](pi, local=local)
+      else:
+         BENCHMARKS[name](pi)
+
+   pi.stop()
+
+   if daemon is not None:
+      daemon.terminate()
@@ -0,0 +1,674 @@
+#!/usr/bin/env python
+"""
+fake_pigpiod is a stand-in for the pigpio daemon, in pure Python, so
+pigpio clients (pigpio.py, pigpio_asyncio.py and the loggers built on
+them) can be run and benchmarked on any machine without a Pi.
+
+It speaks the daemon's socket protocol and keeps just enough state to
+behave like a Pi with nothing connected:
+
+GPIO       MODES/MODEG/PUD, READ/WRITE, BR1/BR2 and TRIG on a bank of
+           54 GPIO.  Writes and triggers send edges to notifications.
+PWM        PWM/PFS/PRS and friends.  A GPIO running PWM toggles at
+           twice the PWM frequency (any frequency is accepted, so a
+           high one floods notifications as fast as they can be
+           taken).
+Notify     NOIB/NB/NP/NC, and EVM/EVT for events.
+Serial     SLRO/SLR/SLRC/SLRI.  Every GPIO opened for bit bang serial
+           reading receives a recorded NMEA capture, looped, as a
+           burst of sentences a second sent at the baud rate it was
+           opened with (all sped up by serial_speed), or as fast as it
+           can be read if serial_speed is None.
+
+Any other command succeeds with a result of zero.  Replies are held
+back until latency seconds after their command arrived, to stand in
+for a slower link or a busier daemon.  Commands which arrive together
+are all run at once and share the delay, so pipelined commands don't
+wait on each other's.
+
+...
+python fake_pigpiod.py -p 8888 -c log_gps_raw.txt
+...
+
+and then, e.g., PIGPIO_PORT=8888 python bench_pigpio.py
+
+A capture is either raw NMEA, or a raw sentence log as written by
+GPS.py (lines of "System_Timestamp,<tab>$sentence*hh").  Without one
+a synthetic capture of GGA and RMC sentences is used.
+"""
+
+import argparse
+import bisect
+import functools
+import multiprocessing
+import operator
+import socket
+import struct
+import threading
+import time
+
+import pigpio
+
+_CMD = struct.Struct('IIII')
+_REPORT = struct.Struct('HHII')
+
+# Bytes of bit bang serial data held for a GPIO, like pigpiod's cyclic
+# buffer.  Older data is lost if the client falls behind.
+SERIAL_BUFFER = 8192
+
+# Most reports a PWM GPIO sends in one go.
+_PWM_BURST = 4096
+
+def nmea_checksum(body):
+   """Returns the checksum of the text between '$' and '*'."""
+   return functools.reduce(operator.xor, bytearray(body.encode('ascii')), 0)
+
+def synthetic_capture(seconds=60):
+   """
+   Returns a capture of a climbing balloon: a GGA and an RMC sentence
+   a second for the given number of seconds.
+   """
+   lines = []
+   for s in range(seconds):
+      hhmmss = "12{:02d}{:02d}.00".format(s // 60 % 60, s % 60)
+      latitude = "52{:07.4f}".format(30.0 + s * 0.001 % 29)
+      longitude = "001{:07.4f}".format(30.0 + s * 0.002 % 29)
+      bodies = [
+         "GPGGA,{},{},N,{},W,1,08,0.9,{:.1f},M,47.0,M,,".format(
+            hhmmss, latitude, longitude, 100.0 + 5 * s),
+         "GPRMC,{},A,{},N,{},W,10.0,045.0,010618,,,A".format(
+            hhmmss, latitude, longitude),
+      ]
+      for body in bodies:
+         lines.append("${}*{:02X}\r\n".format(body, nmea_checksum(body)))
+   return "".join(lines).encode('ascii')
+
+def load_capture(filename):
+   """
+   Returns the NMEA sentences of a capture file, as raw or as logged
+   by GPS.py, as bytes.
+   """
+   sentences = []
+   with open(filename, 'rb') as f:
+      for line in f:
+         start = line.find(b'$')
+         if start >= 0:
+            sentences.append(line[start:].rstrip() + b'\r\n')
+   return b"".join(sentences)
+
+def nmea_epochs(capture):
+   """
+   Splits a capture into the burst of sentences the GPS sends each
+   second.  A burst starts whenever the first sentence type of the
+   capture comes round again.
+   """
+   epochs = []
+   first = None
+   for line in capture.splitlines(True):
+      kind = line.split(b',', 1)[0]
+      if first is None:
+         first = kind
+      if kind == first or not epochs:
+         epochs.append(bytearray())
+      epochs[-1].extend(line)
+   return [bytes(e) for e in epochs]
+
+class _serial:
+   """
+   A GPIO opened for bit bang serial reading.  Each epoch of the
+   capture starts arriving a second after the one before (or when
+   the one before has finished, at a low baud rate), at the baud
+   rate, and the capture loops.
+   """
+
+   def __init__(self, epochs, baud, speed, now):
+      self.data = b"".join(epochs)
+      self.start = now
+      self.position = 0
+      self.lost = 0
+      if speed is None:
+         self.rate = None
+         return
+
+      self.rate = baud / 10.0 * speed
+      self.starts = []
+      self.sizes = []
+      end = 0.0
+      for i, epoch in enumerate(epochs):
+         start = max(i / float(speed), end)
+         end = start + len(epoch) / self.rate
+         self.starts.append(start)
+         self.sizes.append(len(epoch))
+      self.period = max(len(epochs) / float(speed), end)
+      self.before = [sum(self.sizes[:i]) for i in range(len(epochs))]
+
+   def arrived(self, now):
+      """Returns how many bytes have arrived altogether."""
+      t = now - self.start
+      cycles = int(t // self.period)
+      t -= cycles * self.period
+      i = bisect.bisect_right(self.starts, t) - 1
+      part = min(self.sizes[i], int((t - self.starts[i]) * self.rate))
+      return cycles * len(self.data) + self.before[i] + part
+
+   def read(self, count, now):
+      """Returns up to count bytes which have arrived."""
+      if self.rate is None:
+         arrived = self.position + count
+      else:
+         arrived = self.arrived(now)
+      if arrived - self.position > SERIAL_BUFFER:
+         self.lost += arrived - self.position - SERIAL_BUFFER
+         self.position = arrived - SERIAL_BUFFER
+      count = min(count, arrived - self.position)
+      data = bytearray()
+      while len(data) < count:
+         offset = self.position % len(self.data)
+         piece = self.data[offset:offset + count - len(data)]
+         data.extend(piece)
+         self.position += len(piece)
+      return data
+
+class _notifier:
+   """A notification handle, opened by NOIB on a connection."""
+
+   def __init__(self, conn):
+      self.conn = conn
+      self.lock = threading.Lock()
+      self.bits = 0
+      self.event_bits = 0
+      self.seq = 0
+      self.open = True
+
+   def send(self, reports):
+      """Sends (flags, tick, level) reports, if the handle is open."""
+      with self.lock:
+         if not self.open:
+            return
+         data = bytearray()
+         for flags, tick, level in reports:
+            data.extend(_REPORT.pack(self.seq, flags, tick, level))
+            self.seq = (self.seq + 1) & 0xffff
+         try:
+            self.conn.sendall(data)
+         except socket.error:
+            self.open = False
+
+   def close(self):
+      with self.lock:
+         if self.open:
+            self.open = False
+            try:
+               self.conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+               pass
+
+class fake_pigpiod:
+   """
+   A fake pigpio daemon.
+
+            port:= the port to listen on, 0 for any free port.
+         latency:= seconds from a command arriving to its reply
+                   being sent.
+         capture:= NMEA bytes fed to bit bang serial GPIO, default
+                   a [*synthetic_capture*].
+    serial_speed:= how many times faster than its baud rate serial
+                   data arrives, or None for as fast as it's read.
+
+   ...
+   daemon = fake_pigpiod(latency=0.0002)
+   daemon.start()
+   pi = pigpio.pi('localhost', daemon.port)
+   ...
+   """
+
+   def __init__(self, host='localhost', port=0, latency=0.0, capture=None,
+                serial_speed=1.0, listener=None):
+      if listener is None:
+         listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+         listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+         listener.bind((host, port))
+         listener.listen(5)
+      self.listener = listener
+      self.port = listener.getsockname()[1]
+      self.latency = latency
+      if capture is None:
+         capture = synthetic_capture()
+      self.epochs = nmea_epochs(capture)
+      if not self.epochs:
+         raise ValueError("the capture holds no NMEA sentences")
+      self.serial_speed = serial_speed
+
+      self.lock = threading.Lock()
+      self.started = time.time()
+      self.levels = 0
+      self.modes = {}
+      self.pwm_frequency = {}
+      self.pwm_range = {}
+      self.pwm_dutycycle = {}
+      self.serial = {}
+      self.notifiers = {}
+      self._next_handle = 0
+      self._pwm_thread = None
+
+   def tick(self):
+      return int((time.time() - self.started) * 1e6) & 0xffffffff
+
+   def start(self):
+      """Serves clients on a background thread."""
+      t = threading.Thread(target=self.serve_forever)
+      t.daemon = True
+      t.start()
+
+   def serve_forever(self):
+      while True:
+         try:
+            conn, addr = self.listener.accept()
+         except socket.error:
+            break
+         conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+         t = threading.Thread(target=self._connection, args=(conn,))
+         t.daemon = True
+         t.start()
+
+   def stop(self):
+      """Stops accepting clients and closes all notifications."""
+      try:
+         self.listener.shutdown(socket.SHUT_RDWR)
+      except socket.error:
+         pass
+      self.listener.close()
+      for n in list(self.notifiers.values()):
+         n.close()
+
+   def _connection(self, conn):
+      own = []
+      pending = bytearray()
+      try:
+         closing = False
+         while not closing:
+            chunk = conn.recv(65536)
+            if not chunk:
+               break
+            received = time.time()
+            pending.extend(chunk)
+
+            # Every command that has arrived is run straight away, and
+            # their replies go back together once latency has passed
+            # since they arrived, as over a slow link: pipelined
+            # commands share one delay rather than queueing behind
+            # each other's.
+            replies = bytearray()
+            offset = 0
+            while len(pending) - offset >= 16:
+               c, p1, p2, p3 = _CMD.unpack_from(pending, offset)
+               if len(pending) - offset - 16 < p3:
+                  break
+               ext = bytes(pending[offset + 16:offset + 16 + p3])
+               offset += 16 + p3
+
+               if c == pigpio._PI_CMD_NC and p1 in own:
+                  # pigpio closes a notification on its own socket and
+                  # doesn't wait for a reply.
+                  self._close_notifier(p1)
+                  closing = True
+                  break
+
+               handler = _HANDLERS.get(c)
+               res, data = 0, None
+               if handler is not None:
+                  res = handler(self, conn, p1, p2, ext)
+                  if isinstance(res, tuple):
+                     res, data = res
+                  elif c == pigpio._PI_CMD_NOIB and res >= 0:
+                     own.append(res)
+
+               replies.extend(_CMD.pack(c, p1, p2, res & 0xffffffff))
+               if data:
+                  replies.extend(data)
+            del pending[:offset]
+
+            if replies:
+               delay = received + self.latency - time.time()
+               if delay > 0:
+                  time.sleep(delay)
+               with self._conn_lock(conn, own):
+                  conn.sendall(replies)
+      except socket.error:
+         pass
+      finally:
+         for handle in own:
+            self._close_notifier(handle)
+         conn.close()
+
+   def _conn_lock(self, conn, own):
+      """Replies share a socket with reports once it's notifying."""
+      if own and own[0] in self.notifiers:
+         return self.notifiers[own[0]].lock
+      return _no_lock
+
+   # Notifications
+
+   def _notify_edges(self, reports):
+      """Sends (gpio bits, tick, level) edge reports to notifiers."""
+      for n in list(self.notifiers.values()):
+         mine = [(0, tick, level) for bits, tick, level in reports
+                 if bits & n.bits]
+         if mine:
+            n.send(mine)
+
+   def _set_level(self, gpio, level, tick=None):
+      with self.lock:
+         old = self.levels
+         if level:
+            self.levels |= 1 << gpio
+         else:
+            self.levels &= ~(1 << gpio)
+         levels = self.levels
+      if levels != old and gpio < 32:
+         if tick is None:
+            tick = self.tick()
+         self._notify_edges([(1 << gpio, tick, levels & 0xffffffff)])
+
+   def _close_notifier(self, handle):
+      with self.lock:
+         n = self.notifiers.pop(handle, None)
+      if n is not None:
+         n.close()
+
+   def _noib(self, conn, p1, p2, ext):
+      with self.lock:
+         handle = self._next_handle
+         self._next_handle += 1
+         self.notifiers[handle] = _notifier(conn)
+      return handle
+
+   def _nb(self, conn, p1, p2, ext):
+      n = self.notifiers.get(p1)
+      if n is None:
+         return pigpio.PI_BAD_HANDLE
+      n.bits = p2
+      return 0
+
+   def _np(self, conn, p1, p2, ext):
+      return self._nb(conn, p1, 0, ext)
+
+   def _nc(self, conn, p1, p2, ext):
+      if p1 not in self.notifiers:
+         return pigpio.PI_BAD_HANDLE
+      self._close_notifier(p1)
+      return 0
+
+   def _evm(self, conn, p1, p2, ext):
+      n = self.notifiers.get(p1)
+      if n is None:
+         return pigpio.PI_BAD_HANDLE
+      n.event_bits = p2
+      return 0
+
+   def _evt(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_EVENT_ID
+      tick = self.tick()
+      for n in list(self.notifiers.values()):
+         if n.event_bits & (1 << p1):
+            n.send([(pigpio.NTFY_FLAGS_EVENT | p1, tick, 0)])
+      return 0
+
+   # GPIO
+
+   def _modes(self, conn, p1, p2, ext):
+      if p1 > 53:
+         return pigpio.PI_BAD_GPIO
+      if p2 > 7:
+         return pigpio.PI_BAD_MODE
+      self.modes[p1] = p2
+      return 0
+
+   def _modeg(self, conn, p1, p2, ext):
+      if p1 > 53:
+         return pigpio.PI_BAD_GPIO
+      return self.modes.get(p1, pigpio.INPUT)
+
+   def _pud(self, conn, p1, p2, ext):
+      if p1 > 53:
+         return pigpio.PI_BAD_GPIO
+      if p2 > 2:
+         return pigpio.PI_BAD_PUD
+      return 0
+
+   def _read(self, conn, p1, p2, ext):
+      if p1 > 53:
+         return pigpio.PI_BAD_GPIO
+      return (self.levels >> p1) & 1
+
+   def _write(self, conn, p1, p2, ext):
+      if p1 > 53:
+         return pigpio.PI_BAD_GPIO
+      if p2 > 1:
+         return pigpio.PI_BAD_LEVEL
+      self.modes[p1] = pigpio.OUTPUT
+      self.pwm_dutycycle.pop(p1, None)
+      self._set_level(p1, p2)
+      return 0
+
+   def _br1(self, conn, p1, p2, ext):
+      return self.levels & 0xffffffff
+
+   def _br2(self, conn, p1, p2, ext):
+      return (self.levels >> 32) & 0x3fffff
+
+   def _tick(self, conn, p1, p2, ext):
+      return self.tick()
+
+   def _hwver(self, conn, p1, p2, ext):
+      return 0xa02082
+
+   def _pigpv(self, conn, p1, p2, ext):
+      return 79
+
+   def _trig(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_USER_GPIO
+      if p2 > 100:
+         return pigpio.PI_BAD_PULSELEN
+      level = struct.unpack('I', ext[:4])[0] if len(ext) >= 4 else 1
+      tick = self.tick()
+      self._set_level(p1, level, tick)
+      self._set_level(p1, not level, (tick + p2) & 0xffffffff)
+      return 0
+
+   # PWM
+
+   def _pwm(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_USER_GPIO
+      if p2 > self.pwm_range.get(p1, 255):
+         return pigpio.PI_BAD_DUTYCYCLE
+      self.modes[p1] = pigpio.OUTPUT
+      if 0 < p2 < self.pwm_range.get(p1, 255):
+         with self.lock:
+            self.pwm_dutycycle[p1] = p2
+            if self._pwm_thread is None:
+               self._pwm_thread = threading.Thread(target=self._run_pwm)
+               self._pwm_thread.daemon = True
+               self._pwm_thread.start()
+      else:
+         self.pwm_dutycycle.pop(p1, None)
+         self._set_level(p1, p2)
+      return 0
+
+   def _prs(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_USER_GPIO
+      if not 25 <= p2 <= 40000:
+         return pigpio.PI_BAD_DUTYRANGE
+      self.pwm_range[p1] = p2
+      return p2
+
+   def _prg(self, conn, p1, p2, ext):
+      return self.pwm_range.get(p1, 255)
+
+   def _pfs(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_USER_GPIO
+      self.pwm_frequency[p1] = max(p2, 1)
+      return max(p2, 1)
+
+   def _pfg(self, conn, p1, p2, ext):
+      return self.pwm_frequency.get(p1, 800)
+
+   def _gdc(self, conn, p1, p2, ext):
+      return self.pwm_dutycycle.get(p1, 0)
+
+   def _run_pwm(self):
+      """Toggles the GPIO running PWM, reporting each edge."""
+      last = time.time()
+      owed = {}
+      while True:
+         time.sleep(0.001)
+         now = time.time()
+         reports = []
+         with self.lock:
+            running = list(self.pwm_dutycycle)
+            for gpio in running:
+               owed[gpio] = owed.get(gpio, 0.0) + (
+                  (now - last) * 2 * self.pwm_frequency.get(gpio, 800))
+            for gpio in list(owed):
+               if gpio not in self.pwm_dutycycle:
+                  del owed[gpio]
+            last = now
+            for gpio in running:
+               edges = min(int(owed[gpio]), _PWM_BURST)
+               # Anything beyond a burst is dropped, not queued.
+               owed[gpio] = min(owed[gpio] - edges, _PWM_BURST)
+               if not edges:
+                  continue
+               tick = self.tick()
+               for e in range(edges):
+                  self.levels ^= 1 << gpio
+                  reports.append((1 << gpio, tick, self.levels & 0xffffffff))
+         if reports:
+            self._notify_edges(reports)
+
+   # Bit bang serial
+
+   def _slro(self, conn, p1, p2, ext):
+      if p1 > 31:
+         return pigpio.PI_BAD_USER_GPIO
+      if not 50 <= p2 <= 250000:
+         return pigpio.PI_BAD_WAVE_BAUD
+      bb_bits = struct.unpack('I', ext[:4])[0] if len(ext) >= 4 else 8
+      if not 1 <= bb_bits <= 32:
+         return pigpio.PI_BAD_DATABITS
+      with self.lock:
+         if p1 in self.serial:
+            return pigpio.PI_GPIO_IN_USE
+         self.serial[p1] = _serial(
+            self.epochs, p2, self.serial_speed, time.time())
+      return 0
+
+   def _slr(self, conn, p1, p2, ext):
+      with self.lock:
+         s = self.serial.get(p1)
+         if s is None:
+            return pigpio.PI_NOT_SERIAL_GPIO
+         data = s.read(p2, time.time())
+      return len(data), data
+
+   def _slrc(self, conn, p1, p2, ext):
+      with self.lock:
+         if self.serial.pop(p1, None) is None:
+            return pigpio.PI_NOT_SERIAL_GPIO
+      return 0
+
+   def _slri(self, conn, p1, p2, ext):
+      if p1 not in self.serial:
+         return pigpio.PI_NOT_SERIAL_GPIO
+      if p2 > 1:
+         return pigpio.PI_BAD_SER_INVERT
+      return 0
+
+class _null_lock:
+   def __enter__(self):
+      return self
+   def __exit__(self, exc_type, exc_value, traceback):
+      return False
+
+_no_lock = _null_lock()
+
+_HANDLERS = {
+   pigpio._PI_CMD_MODES: fake_pigpiod._modes,
+   pigpio._PI_CMD_MODEG: fake_pigpiod._modeg,
+   pigpio._PI_CMD_PUD: fake_pigpiod._pud,
+   pigpio._PI_CMD_READ: fake_pigpiod._read,
+   pigpio._PI_CMD_WRITE: fake_pigpiod._write,
+   pigpio._PI_CMD_PWM: fake_pigpiod._pwm,
+   pigpio._PI_CMD_PRS: fake_pigpiod._prs,
+   pigpio._PI_CMD_PFS: fake_pigpiod._pfs,
+   pigpio._PI_CMD_BR1: fake_pigpiod._br1,
+   pigpio._PI_CMD_BR2: fake_pigpiod._br2,
+   pigpio._PI_CMD_TICK: fake_pigpiod._tick,
+   pigpio._PI_CMD_HWVER: fake_pigpiod._hwver,
+   pigpio._PI_CMD_NB: fake_pigpiod._nb,
+   pigpio._PI_CMD_NP: fake_pigpiod._np,
+   pigpio._PI_CMD_NC: fake_pigpiod._nc,
+   pigpio._PI_CMD_PRG: fake_pigpiod._prg,
+   pigpio._PI_CMD_PFG: fake_pigpiod._pfg,
+   pigpio._PI_CMD_PIGPV: fake_pigpiod._pigpv,
+   pigpio._PI_CMD_TRIG: fake_pigpiod._trig,
+   pigpio._PI_CMD_SLRO: fake_pigpiod._slro,
+   pigpio._PI_CMD_SLR: fake_pigpiod._slr,
+   pigpio._PI_CMD_SLRC: fake_pigpiod._slrc,
+   pigpio._PI_CMD_SLRI: fake_pigpiod._slri,
+   pigpio._PI_CMD_GDC: fake_pigpiod._gdc,
+   pigpio._PI_CMD_NOIB: fake_pigpiod._noib,
+   pigpio._PI_CMD_EVM: fake_pigpiod._evm,
+   pigpio._PI_CMD_EVT: fake_pigpiod._evt,
+}
+
+def _serve(listener, options):
+   fake_pigpiod(listener=listener, **options).serve_forever()
+
+def spawn(host='localhost', port=0, **options):
+   """
+   Starts a fake daemon in a child process, so it doesn't share the
+   interpreter with the client being measured.  Takes the same
+   options as [*fake_pigpiod*] and returns (process, port).
+   """
+   listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+   listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+   listener.bind((host, port))
+   listener.listen(5)
+   process = multiprocessing.Process(target=_serve, args=(listener, options))
+   process.daemon = True
+   process.start()
+   port = listener.getsockname()[1]
+   listener.close()
+   return process, port
+
+if __name__ == "__main__":
+
+   parser = argparse.ArgumentParser(
+      description="A fake pigpio daemon for running clients off the Pi.")
+   parser.add_argument("-p", "--port", type=int, default=8888)
+   parser.add_argument("-l", "--latency", type=float, default=0.0,
+                       help="seconds from a command to its reply")
+   parser.add_argument("-c", "--capture",
+                       help="NMEA capture fed to bit bang serial GPIO")
+   parser.add_argument("-s", "--serial-speed", type=float, default=1.0,
+                       help="times faster than its baud rate serial data "
+                       "arrives, 0 for as fast as it's read")
+   args = parser.parse_args()
+
+   capture = None
+   if args.capture:
+      capture = load_capture(args.capture)
+   daemon = fake_pigpiod(
+      host='', port=args.port, latency=args.latency, capture=capture,
+      serial_speed=args.serial_speed or None)
+   print("fake pigpiod listening on port {}".format(daemon.port))
+   try:
+      daemon.serve_forever()
+   except KeyboardInterrupt:
+      daemon.stop()
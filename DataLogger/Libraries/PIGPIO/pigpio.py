@@ -117,6 +117,7 @@ get_servo_pulsewidth      Get servo pulsewidth set on a GPIO
 
 callback                  Create GPIO level change callback
 wait_for_edge             Wait for GPIO level change
+wait_for_edge_tick        Wait for GPIO level change, get level and tick
 
 Intermediate
 
@@ -150,6 +151,7 @@ notify_close              Close a notification
 
 bb_serial_read_open       Open a GPIO for bit bang serial reads
 bb_serial_read            Read bit bang serial data from  a GPIO
+bb_serial_reader          Stream bit bang serial data from a GPIO
 bb_serial_read_close      Close a GPIO for bit bang serial reads
 bb_serial_invert          Invert serial logic (1 invert, 0 normal)
 
@@ -275,6 +277,7 @@ Events
 event_callback            Sets a callback for an event
 event_trigger             Triggers an event
 wait_for_event            Wait for an event
+wait_for_event_tick       Wait for an event, get its tick
 
 Custom
 
@@ -293,6 +296,8 @@ pigpio.tickDiff           Returns difference between two ticks
 """
 
 import sys
+import copy
+import itertools
 import socket
 import struct
 import time
@@ -391,6 +396,11 @@ SPI_RX_LSBFIRST = 1 << 15
 
 EVENT_BSC = 31
 
+# command socket pool checkout
+
+CHECKOUT_THREAD      = 0
+CHECKOUT_ROUND_ROBIN = 1
+
 _SOCK_CMD_LEN = 16
 
 # pigpio command numbers
@@ -542,6 +552,24 @@ _PI_CMD_EVT  =116
 
 _PI_CMD_PROCU=117
 
+# Commands whose reply is followed by extension data, the result (if
+# positive) giving its length in bytes.
+
+_EXT_REPLY_CMDS = frozenset([
+   _PI_CMD_BI2CZ, _PI_CMD_BSCX, _PI_CMD_CF2, _PI_CMD_FL, _PI_CMD_FR,
+   _PI_CMD_I2CPK, _PI_CMD_I2CRD, _PI_CMD_I2CRI, _PI_CMD_I2CRK, _PI_CMD_I2CZ,
+   _PI_CMD_PROCP, _PI_CMD_SERR, _PI_CMD_SLR, _PI_CMD_SPIX, _PI_CMD_SPIR,
+   _PI_CMD_BSPIX])
+
+# A notification report: sequence number, flags, tick and levels.
+
+_NTFY_REPORT = struct.Struct('HHII')
+
+# Most commands a batch sends before collecting their replies, so the
+# replies never back up far enough to stall the daemon.
+
+_BATCH_WINDOW = 256
+
 # pigpio error numbers
 
 _PI_INIT_FAILED     =-1
@@ -835,6 +863,8 @@ _errors=[
    [PI_BAD_EVENT_ID      , "bad event id"],
 ]
 
+_error_text = dict(_errors)
+
 _except_a = "%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%\n{}"
 
 _except_z = "%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%"
@@ -865,6 +895,101 @@ class _socklock:
       self.s = None
       self.l = threading.Lock()
 
+class _socklock_pool(object):
+   """
+   A pool of command sockets which stands in for a _socklock.
+
+   Acquiring the pool's lock checks out one of its sockets for the
+   calling thread, which then sees it as the pool's socket until it
+   releases the lock.  Threads using different sockets don't wait
+   for each other's commands.
+   """
+
+   def __init__(self, host, port, size, checkout=CHECKOUT_THREAD):
+      self.l = self
+      self.checkout = checkout
+      self.socks = []
+      self.locks = []
+      self._local = threading.local()
+      self._counter = itertools.count()
+      self._stats_lock = threading.Lock()
+      self.contended = 0
+      self.wait_time = 0.0
+      self.max_wait = 0.0
+      try:
+         for i in range(size):
+            s = socket.create_connection((host, port), None)
+            # Disable the Nagle algorithm.
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socks.append(s)
+            self.locks.append(threading.Lock())
+         # Checkouts of each socket, counted under the socket's lock.
+         self.acquires = [0] * size
+      except:
+         self.close()
+         raise
+
+   @property
+   def s(self):
+      """The socket checked out by the calling thread, if any."""
+      index = getattr(self._local, 'index', None)
+      if index is None:
+         return None
+      return self.socks[index]
+
+   def acquire(self):
+      """Checks out a socket for the calling thread."""
+      count = len(self.locks)
+      if self.checkout == CHECKOUT_THREAD:
+         # Threads are given sockets in turn, the first time they ask.
+         index = getattr(self._local, 'home', None)
+         if index is None:
+            index = self._local.home = next(self._counter) % count
+         got = self.locks[index].acquire(False)
+      else:
+         # Take the next free socket from the next one round.
+         index = next(self._counter) % count
+         for i in range(count):
+            got = self.locks[(index + i) % count].acquire(False)
+            if got:
+               index = (index + i) % count
+               break
+
+      if not got:
+         start = time.time()
+         self.locks[index].acquire()
+         waited = time.time() - start
+         with self._stats_lock:
+            self.contended += 1
+            self.wait_time += waited
+            if waited > self.max_wait:
+               self.max_wait = waited
+
+      self.acquires[index] += 1
+      self._local.index = index
+      return True
+
+   def release(self):
+      """Returns the calling thread's socket to the pool."""
+      index = self._local.index
+      self._local.index = None
+      self.locks[index].release()
+
+   def stats(self):
+      """Returns a dict of checkout statistics."""
+      with self._stats_lock:
+         return {'sockets': len(self.socks),
+                 'acquires': sum(self.acquires),
+                 'contended': self.contended,
+                 'wait_time': self.wait_time,
+                 'max_wait': self.max_wait}
+
+   def close(self):
+      """Closes all the sockets."""
+      for s in self.socks:
+         s.close()
+      self.socks = []
+
 class error(Exception):
    """pigpio module exception"""
    def __init__(self, value):
@@ -901,10 +1026,10 @@ def error_text(errnum):
    level not 0-1
    ...
    """
-   for e in _errors:
-      if e[0] == errnum:
-         return e[1]
-   return "unknown error ({})".format(errnum)
+   try:
+      return _error_text[errnum]
+   except KeyError:
+      return "unknown error ({})".format(errnum)
 
 def tickDiff(t1, t2):
    """
@@ -1049,6 +1174,15 @@ def _pigpio_command_ext_nolock(sl, cmd, p1, p2, p3, extents):
    dummy, res = struct.unpack('12sI', sl.s.recv(_SOCK_CMD_LEN))
    return res
 
+def _recv_into(s, view):
+   """Fills the memoryview view from socket s."""
+   got = 0
+   while got < len(view):
+      received = s.recv_into(view[got:])
+      if received == 0:
+         raise error("pigpio connection closed")
+      got += received
+
 class _event_ADT:
    """
    An ADT class to hold event callback information.
@@ -1094,6 +1228,10 @@ class _callback_thread(threading.Thread):
       self.event_bits = 0
       self.callbacks = []
       self.events = []
+      # Callbacks by GPIO and by event id, rebuilt as tuples whenever
+      # they change so the notification thread can read them unlocked.
+      self.gpio_callbacks = [()] * 32
+      self.event_callbacks = [()] * 32
       self.sl.s = socket.create_connection((host, port), None)
       self.lastLevel = _pigpio_command(self.sl,  _PI_CMD_BR1, 0, 0)
       self.handle = _u2i(_pigpio_command(self.sl, _PI_CMD_NOIB, 0, 0))
@@ -1109,6 +1247,7 @@ class _callback_thread(threading.Thread):
    def append(self, callb):
       """Adds a callback to the notification thread."""
       self.callbacks.append(callb)
+      self.gpio_callbacks[callb.gpio] += (callb,)
       self.monitor = self.monitor | callb.bit
       _pigpio_command(self.control, _PI_CMD_NB, self.handle, self.monitor)
 
@@ -1116,6 +1255,8 @@ class _callback_thread(threading.Thread):
       """Removes a callback from the notification thread."""
       if callb in self.callbacks:
          self.callbacks.remove(callb)
+         self.gpio_callbacks[callb.gpio] = tuple(
+            c for c in self.gpio_callbacks[callb.gpio] if c is not callb)
          newMonitor = 0
          for c in self.callbacks:
             newMonitor |= c.bit
@@ -1129,6 +1270,7 @@ class _callback_thread(threading.Thread):
       Adds an event callback to the notification thread.
       """
       self.events.append(callb)
+      self.event_callbacks[callb.event] += (callb,)
       self.event_bits = self.event_bits | callb.bit
       _pigpio_command(self.control, _PI_CMD_EVM, self.handle, self.event_bits)
 
@@ -1138,6 +1280,8 @@ class _callback_thread(threading.Thread):
       """
       if callb in self.events:
          self.events.remove(callb)
+         self.event_callbacks[callb.event] = tuple(
+            c for c in self.event_callbacks[callb.event] if c is not callb)
          new_event_bits = 0
          for c in self.events:
             new_event_bits |= c.bit
@@ -1151,42 +1295,57 @@ class _callback_thread(threading.Thread):
 
       lastLevel = self.lastLevel
 
-      RECV_SIZ = 4096
       MSG_SIZ = 12
+      RECV_SIZ = 4096
+
+      gpio_callbacks = self.gpio_callbacks
+      event_callbacks = self.event_callbacks
+
+      # Reports are received straight into buf.  A partial report left
+      # at the end of one recv is moved to the front for the next.
+      buf = bytearray(RECV_SIZ + MSG_SIZ)
+      view = memoryview(buf)
+      kept = 0
 
-      buf = bytes()
       while self.go:
 
-         buf += self.sl.s.recv(RECV_SIZ)
-         offset = 0
+         received = self.sl.s.recv_into(view[kept:])
+         if received == 0:
+            break
+         end = kept + received
+         whole = end - end % MSG_SIZ
 
-         while self.go and (len(buf) - offset) >= MSG_SIZ:
-            msgbuf = buf[offset:offset + MSG_SIZ]
-            offset += MSG_SIZ
-            seq, flags, tick, level = (struct.unpack('HHII', msgbuf))
+         for offset in range(0, whole, MSG_SIZ):
+            seq, flags, tick, level = _NTFY_REPORT.unpack_from(buf, offset)
+
+            if not self.go:
+               break
 
             if flags == 0:
                changed = level ^ lastLevel
                lastLevel = level
-               for cb in self.callbacks:
-                  if cb.bit & changed:
-                     newLevel = 0
-                     if cb.bit & level:
-                        newLevel = 1
-                     if (cb.edge ^ newLevel):
-                         cb.func(cb.gpio, newLevel, tick)
+               while changed:
+                  bit = changed & -changed
+                  changed ^= bit
+                  gpio = bit.bit_length() - 1
+                  if gpio < 32:
+                     newLevel = 1 if bit & level else 0
+                     for cb in gpio_callbacks[gpio]:
+                        if (cb.edge ^ newLevel):
+                           cb.func(gpio, newLevel, tick)
             else:
                if flags & NTFY_FLAGS_WDOG:
                   gpio = flags & NTFY_FLAGS_GPIO
-                  for cb in self.callbacks:
-                     if cb.gpio == gpio:
-                        cb.func(gpio, TIMEOUT, tick)
+                  for cb in gpio_callbacks[gpio]:
+                     cb.func(gpio, TIMEOUT, tick)
                elif flags & NTFY_FLAGS_EVENT:
                   event = flags & NTFY_FLAGS_GPIO
-                  for cb in self.events:
-                     if cb.event == event:
-                        cb.func(event, tick)
-         buf = buf[offset:]
+                  for cb in event_callbacks[event]:
+                     cb.func(event, tick)
+
+         kept = end - whole
+         if kept:
+            view[:kept] = view[whole:end]
 
       self.sl.s.close()
 
@@ -1286,16 +1445,20 @@ class _wait_for_edge:
       """Initialises a wait_for_edge."""
       self._notify = notify
       self.callb = _callback_ADT(gpio, edge, self.func)
-      self.trigger = False
+      self.edge = None
+      self._triggered = threading.Event()
       self._notify.append(self.callb)
-      self.start = time.time()
-      while (self.trigger == False) and ((time.time()-self.start) < timeout):
-         time.sleep(0.05)
+      self.trigger = self._triggered.wait(timeout)
       self._notify.remove(self.callb)
 
    def func(self, gpio, level, tick):
-      """Sets wait_for_edge triggered."""
-      self.trigger = True
+      """
+      Records the level and tick of the first edge and wakes the
+      waiting thread.  Called from the notification thread.
+      """
+      if self.edge is None:
+         self.edge = (level, tick)
+         self._triggered.set()
 
 class _wait_for_event:
    """Encapsulates waiting for an event."""
@@ -1304,24 +1467,303 @@ class _wait_for_event:
       """Initialises wait_for_event."""
       self._notify = notify
       self.callb = _event_ADT(event, self.func)
-      self.trigger = False
+      self.tick = None
+      self._triggered = threading.Event()
       self._notify.append_event(self.callb)
-      self.start = time.time()
-      while (self.trigger == False) and ((time.time()-self.start) < timeout):
-         time.sleep(0.05)
+      self.trigger = self._triggered.wait(timeout)
       self._notify.remove_event(self.callb)
 
    def func(self, event, tick):
-      """Sets wait_for_event triggered."""
-      self.trigger = True
+      """
+      Records the first event and wakes the waiting thread.  Called
+      from the notification thread.
+      """
+      if self.tick is None:
+         self.tick = tick
+         self._triggered.set()
+
+class _batch_socket:
+   """
+   Stands in for the command socket while a batch records pi
+   methods.  Commands are packed straight onto the end of the
+   batch's send buffer, and every one is answered with a zero
+   result.
+   """
+
+   def __init__(self, sent):
+      self.sent = sent
+
+   def send(self, data):
+      self.sent.extend(data)
+      return len(data)
+
+   def sendall(self, data):
+      self.sent.extend(data)
+
+   def recv(self, count):
+      return _BATCH_ZERO_REPLY[:count]
+
+_BATCH_ZERO_REPLY = struct.pack('IIII', 0, 0, 0, 0)
+
+# How a batched call's result is worked out from its reply: as the
+# pi methods do with _u2i, raising on an error, or with u2i, or
+# returning it unsigned.
+_BATCH_CHECKED, _BATCH_SIGNED, _BATCH_UNSIGNED = range(3)
+
+# The pi methods a batch accepts, each of which sends exactly one
+# command whose reply carries no extension data and touches nothing
+# else on the pi, and how its result is worked out.
+_BATCH_METHODS = {
+   'set_mode': _BATCH_CHECKED,
+   'get_mode': _BATCH_CHECKED,
+   'set_pull_up_down': _BATCH_CHECKED,
+   'read': _BATCH_CHECKED,
+   'write': _BATCH_CHECKED,
+   'set_PWM_dutycycle': _BATCH_CHECKED,
+   'get_PWM_dutycycle': _BATCH_CHECKED,
+   'set_PWM_range': _BATCH_CHECKED,
+   'get_PWM_range': _BATCH_CHECKED,
+   'get_PWM_real_range': _BATCH_CHECKED,
+   'set_PWM_frequency': _BATCH_CHECKED,
+   'get_PWM_frequency': _BATCH_CHECKED,
+   'set_servo_pulsewidth': _BATCH_CHECKED,
+   'get_servo_pulsewidth': _BATCH_CHECKED,
+   'set_watchdog': _BATCH_CHECKED,
+   'gpio_trigger': _BATCH_CHECKED,
+   'set_glitch_filter': _BATCH_CHECKED,
+   'set_noise_filter': _BATCH_CHECKED,
+   'clear_bank_1': _BATCH_CHECKED,
+   'clear_bank_2': _BATCH_CHECKED,
+   'set_bank_1': _BATCH_CHECKED,
+   'set_bank_2': _BATCH_CHECKED,
+   'read_bank_1': _BATCH_UNSIGNED,
+   'read_bank_2': _BATCH_UNSIGNED,
+   'hardware_clock': _BATCH_CHECKED,
+   'get_pad_strength': _BATCH_CHECKED,
+   'set_pad_strength': _BATCH_CHECKED,
+   'event_trigger': _BATCH_CHECKED,
+   'get_current_tick': _BATCH_UNSIGNED,
+   'get_hardware_revision': _BATCH_UNSIGNED,
+   'get_pigpio_version': _BATCH_UNSIGNED,
+   'custom_1': _BATCH_SIGNED,
+}
+
+class _batch:
+   """
+   Queues pigpio commands to be run in a single round trip.
+
+   The pi methods in _BATCH_METHODS, which each send a single
+   command, may be called on a batch, e.g. b.write(17, 1).
+   The call packs its command onto the batch's send buffer rather
+   than running it, and returns its position in the results.  [*run*]
+   sends the buffer and works out each call's result straight from
+   its reply.
+   """
+
+   def __init__(self, pi):
+      self._pi = pi
+      self._sent = bytearray()
+      # Where each call's command ends in _sent, and how to work out
+      # its result.
+      self._ends = []
+      self._kinds = []
+      # Calls are recorded on a copy of the pi whose command socket
+      # is a _batch_socket.
+      self._shim = copy.copy(pi)
+      self._shim.sl = _socklock()
+      self._shim.sl.s = _batch_socket(self._sent)
+      self.results = None
+
+   def __getattr__(self, name):
+      # Anything else is refused before it can run, as it would run
+      # on the pi itself: its callbacks, notifications and so on.
+      if name not in _BATCH_METHODS:
+         raise error("pi.{} can't be batched".format(name))
+      method = getattr(self._shim, name)
+      kind = _BATCH_METHODS[name]
+      def record(*args, **kwargs):
+         sent = self._sent
+         start = len(sent)
+         try:
+            method(*args, **kwargs)
+         except:
+            del sent[start:]
+            raise
+         self._ends.append(len(sent))
+         self._kinds.append(kind)
+         return len(self._ends) - 1
+      return record
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exc_type, exc_value, traceback):
+      if exc_type is None:
+         self.run()
+
+   def run(self):
+      """
+      Runs the queued commands and returns a list of their results,
+      in the order they were queued.  If any call would have raised
+      an exception, the first such exception is raised once all the
+      replies have been read.
+      """
+      ends = self._ends
+      kinds = self._kinds
+      self._ends = []
+      self._kinds = []
+      count = len(ends)
+      replies = bytearray(_SOCK_CMD_LEN * count)
+
+      sent = memoryview(self._sent)
+      received = memoryview(replies)
+      sl = self._pi.sl
+      sl.l.acquire()
+      try:
+         # Windows of commands go out one ahead of the replies being
+         # read, so the daemon always has the next window to work on
+         # but its replies never back up far.
+         windows = [(first, min(first + _BATCH_WINDOW, count))
+                    for first in range(0, count, _BATCH_WINDOW)]
+         s = sl.s
+         for w, (first, last) in enumerate(windows):
+            if w == 0:
+               s.sendall(sent[:ends[last - 1]])
+            if w + 1 < len(windows):
+               following = windows[w + 1][1]
+               s.sendall(sent[ends[last - 1]:ends[following - 1]])
+            _recv_into(
+               s, received[first * _SOCK_CMD_LEN:last * _SOCK_CMD_LEN])
+      finally:
+         sl.l.release()
+         # The views must go before _sent can be resized.
+         del sent, received
+         del self._sent[:]
+
+      results = []
+      failure = None
+      for i, kind in enumerate(kinds):
+         res = struct.unpack_from(
+            'IIIi', replies, i * _SOCK_CMD_LEN)[3]
+         if kind == _BATCH_UNSIGNED:
+            res &= 0xffffffff
+         elif kind == _BATCH_CHECKED and res < 0 and exceptions and \
+              failure is None:
+            failure = error(error_text(res))
+         results.append(res)
+      self.results = results
+      if failure is not None:
+         raise failure
+      return results
+
+class _bb_serial_reader:
+   """
+   Streams data from a GPIO opened for bit bang serial reading.
+
+   Data is read straight into a buffer, which may be supplied by the
+   caller, with no intermediate copies.  When no data is waiting the
+   reader sleeps between polls of the daemon: a fixed poll_interval
+   if one is given, otherwise an interval which doubles on every
+   empty poll, up to max_interval, and drops back to min_interval as
+   soon as data arrives.
+   """
+
+   def __init__(self, pi, user_gpio, buffer=None, poll_interval=None,
+                min_interval=0.001, max_interval=0.1):
+      self._pi = pi
+      self.gpio = user_gpio
+      if buffer is None:
+         buffer = bytearray(8192)
+      self.buffer = buffer
+      self._view = memoryview(buffer)
+      self.poll_interval = poll_interval
+      self.min_interval = min_interval
+      self.max_interval = max_interval
+      self._interval = min_interval
+      self.closed = False
+      self.polls = 0
+      self.empty_polls = 0
+      self.bytes = 0
+
+   def readinto(self, buf):
+      """
+      Reads whatever data is waiting, up to the size of buf, into
+      buf without waiting.  Returns the number of bytes read, which
+      may be zero, or a negative error code if exceptions are off.
+      """
+      view = memoryview(buf)
+      sl = self._pi.sl
+      sl.l.acquire()
+      try:
+         count = u2i(
+            _pigpio_command_nolock(sl, _PI_CMD_SLR, self.gpio, len(view)))
+         if count > 0:
+            _recv_into(sl.s, view[:count])
+      finally:
+         sl.l.release()
+      self.polls += 1
+      if count > 0:
+         self.bytes += count
+      elif count == 0:
+         self.empty_polls += 1
+      return _u2i(count)
+
+   def read(self, timeout=None):
+      """
+      Waits for data and returns it as a memoryview of the reader's
+      buffer, valid until the next read.  The view is empty if
+      timeout seconds pass (or the reader is closed) first.  If the
+      daemon reports an error it is raised, or returned as a negative
+      error code if exceptions are off.
+      """
+      if timeout is not None:
+         deadline = time.time() + timeout
+      while not self.closed:
+         count = self.readinto(self._view)
+         if count > 0:
+            self._interval = self.min_interval
+            return self._view[:count]
+         if count < 0:
+            return count
+
+         if self.poll_interval is not None:
+            interval = self.poll_interval
+         else:
+            interval = self._interval
+            self._interval = min(self._interval * 2, self.max_interval)
+         if timeout is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+               break
+            interval = min(interval, remaining)
+         time.sleep(interval)
+      return self._view[:0]
+
+   def __iter__(self):
+      return self
+
+   def __next__(self):
+      """Waits for and returns the next chunk of data, see [*read*]."""
+      data = self.read()
+      if self.closed:
+         raise StopIteration
+      return data
+
+   next = __next__
+
+   def close(self):
+      """
+      Ends the iteration.  The GPIO is left open; close it with
+      [*bb_serial_read_close*].
+      """
+      self.closed = True
 
 class pi():
 
    def _rxbuf(self, count):
       """Returns count bytes from the command socket."""
-      ext = bytearray(self.sl.s.recv(count))
-      while len(ext) < count:
-         ext.extend(self.sl.s.recv(count - len(ext)))
+      ext = bytearray(count)
+      _recv_into(self.sl.s, memoryview(ext))
       return ext
 
    def set_mode(self, gpio, mode):
@@ -4431,6 +4873,42 @@ class pi():
       return bytes, data
 
    
+   def bb_serial_reader(self, user_gpio, buffer=None, poll_interval=None,
+                        max_interval=0.1):
+      """
+      Returns a reader which streams data from a GPIO opened for bit
+      bang serial reading.
+
+          user_gpio:= 0-31 (opened in a prior call to
+                      [*bb_serial_read_open*])
+             buffer:= a bytearray (or other writable buffer) to read
+                      into, default a new 8192 byte bytearray.
+      poll_interval:= seconds between polls when no data is waiting.
+                      By default the interval backs off from 1 ms up
+                      to max_interval while the line is quiet.
+       max_interval:= the longest interval between polls when backing
+                      off, default 0.1.
+
+      Unlike [*bb_serial_read*], which returns immediately, the
+      reader's read method waits (sleeping between polls) until
+      there is data or a timeout expires, so a loop over the data
+      costs next to nothing while the line is quiet.  The reader is
+      also an iterator of chunks of data.  Each chunk is a memoryview
+      of the buffer and is only valid until the next read.
+
+      The reader's readinto method reads whatever is waiting into a
+      buffer of the caller's, without waiting.
+
+      ...
+      pi.bb_serial_read_open(4, 9600)
+      reader = pi.bb_serial_reader(4)
+      for data in reader:
+         print(bytes(data))
+      ...
+      """
+      return _bb_serial_reader(
+         self, user_gpio, buffer, poll_interval, max_interval=max_interval)
+
    def bb_serial_read_close(self, user_gpio):
       """
       Closes a GPIO for bit bang reading of serial data.
@@ -5000,10 +5478,9 @@ class pi():
       The function returns when the edge is detected or after
       the number of seconds specified by timeout has expired.
 
-      Do not use this function for precise timing purposes,
-      the edge is only checked 20 times a second. Whenever
-      you need to know the accurate time of GPIO events use
-      a [*callback*] function.
+      The waiting thread is woken by the notification thread as
+      soon as the edge arrives.  Use [*wait_for_edge_tick*] for the
+      level and tick of the edge.
 
       The function returns True if the edge is detected,
       otherwise False.
@@ -5023,6 +5500,25 @@ class pi():
       a = _wait_for_edge(self._notify, user_gpio, edge, wait_timeout)
       return a.trigger
 
+   def wait_for_edge_tick(self, user_gpio, edge=RISING_EDGE,
+                          wait_timeout=60.0):
+      """
+      Wait for an edge event on a GPIO, as [*wait_for_edge*] does,
+      and return the level and tick of the edge, as passed to a
+      [*callback*] function, or None if no edge is detected before
+      the timeout.  With EITHER_EDGE the level tells which edge it
+      was.
+
+      ...
+      edge = pi.wait_for_edge_tick(23, pigpio.EITHER_EDGE, 5.0)
+      if edge is not None:
+         level, tick = edge
+         print("level {} at tick {}".format(level, tick))
+      ...
+      """
+      a = _wait_for_edge(self._notify, user_gpio, edge, wait_timeout)
+      return a.edge
+
    def wait_for_event(self, event, wait_timeout=60.0):
       """
       Wait for an event.
@@ -5033,6 +5529,10 @@ class pi():
       The function returns when the event is signalled or after
       the number of seconds specified by timeout has expired.
 
+      The waiting thread is woken by the notification thread as
+      soon as the event arrives.  Use [*wait_for_event_tick*] for
+      the tick of the event.
+
       The function returns True if the event is detected,
       otherwise False.
 
@@ -5046,9 +5546,85 @@ class pi():
       a = _wait_for_event(self._notify, event, wait_timeout)
       return a.trigger
 
+   def wait_for_event_tick(self, event, wait_timeout=60.0):
+      """
+      Wait for an event, as [*wait_for_event*] does, and return the
+      tick of the event, as passed to an [*event_callback*]
+      function, or None if it isn't signalled before the timeout.
+
+      ...
+      tick = pi.wait_for_event_tick(23)
+      if tick is not None:
+         print("event at tick {}".format(tick))
+      ...
+      """
+      a = _wait_for_event(self._notify, event, wait_timeout)
+      return a.tick
+
+   def batch(self):
+      """
+      Returns a batch of commands to be run in a single round trip
+      to the daemon.
+
+      Commands are queued by calling pi methods on the batch, and
+      are sent together when the batch is run, either explicitly or
+      at the end of a with block.  The results are returned in a
+      list, in the order the commands were queued.  Sending the
+      commands together means a burst of commands costs one
+      round trip rather than one each.
+
+      Only methods which send a single command and use no other
+      state of the pi may be batched, such as write, read,
+      set_mode, set_PWM_dutycycle and read_bank_1.  Others, such as
+      those reading data back, using callbacks or waiting for edges
+      or events, raise an error as soon as they are looked up on a
+      batch, without running.
+
+      ...
+      with pi.batch() as b:
+         b.write(17, 1)
+         b.set_PWM_dutycycle(18, 128)
+         b.read(4)
+      print(b.results)
+      [0, 0, 1]
+
+      b = pi.batch()
+      for gpio in (5, 6, 13):
+         b.write(gpio, 0)
+      print(b.run())
+      [0, 0, 0]
+      ...
+      """
+      return _batch(self)
+
+   def get_command_stats(self):
+      """
+      Returns a dict of command socket pool statistics, or None if
+      the pi was not created with a pool.
+
+      . .
+      sockets    number of command sockets in the pool
+      acquires   number of times a socket was checked out
+      contended  number of those which had to wait for the socket
+      wait_time  total seconds spent waiting
+      max_wait   longest wait in seconds
+      . .
+
+      ...
+      pi = pigpio.pi(command_sockets=4)
+      ...
+      print(pi.get_command_stats())
+      ...
+      """
+      if isinstance(self.sl, _socklock_pool):
+         return self.sl.stats()
+      return None
+
    def __init__(self,
                 host = os.getenv("PIGPIO_ADDR", 'localhost'),
-                port = os.getenv("PIGPIO_PORT", 8888)):
+                port = os.getenv("PIGPIO_PORT", 8888),
+                command_sockets = None,
+                checkout = CHECKOUT_THREAD):
       """
       Grants access to a Pi's GPIO.
 
@@ -5061,6 +5637,18 @@ class pi():
              environment variable.  The pigpio daemon must have been
              started with the same port number.
 
+      command_sockets:= the number of command sockets to open.  By
+             default there is one, shared by all threads.  If a number
+             is given, a pool of that many sockets is opened, so
+             threads need not wait for each other's commands, and
+             [*get_command_stats*] reports how often they did.
+
+      checkout:= how threads are given sockets from the pool.
+             CHECKOUT_THREAD (default) gives each thread its own
+             socket, in turn, the first time it runs a command.
+             CHECKOUT_ROUND_ROBIN gives each command the next free
+             socket.
+
       This connects to the pigpio daemon and reserves resources
       to be used for sending commands and receiving notifications.
 
@@ -5073,6 +5661,8 @@ class pi():
       pi = pigpio.pi('mypi')       # specify host, default port
       pi = pigpio.pi('mypi', 7777) # specify host and port
 
+      pi = pigpio.pi(command_sockets=3) # a socket each for 3 threads
+
       pi = pigpio.pi()             # exit script if no connection
       if not pi.connected:
          exit()
@@ -5092,10 +5682,13 @@ class pi():
       self._port = port
 
       try:
-         self.sl.s = socket.create_connection((host, port), None)
+         if command_sockets is None:
+            self.sl.s = socket.create_connection((host, port), None)
 
-         # Disable the Nagle algorithm.
-         self.sl.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Disable the Nagle algorithm.
+            self.sl.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+         else:
+            self.sl = _socklock_pool(host, port, command_sockets, checkout)
 
          self._notify = _callback_thread(self.sl, host, port)
 
@@ -5116,7 +5709,9 @@ class pi():
 
          self.connected = False
 
-         if self.sl.s is not None:
+         if isinstance(self.sl, _socklock_pool):
+            self.sl.close()
+         elif self.sl.s is not None:
             self.sl.s = None
 
          s = "Can't connect to pigpio at {}({})".format(host, str(port))
@@ -5144,7 +5739,9 @@ class pi():
          self._notify.stop()
          self._notify = None
 
-      if self.sl.s is not None:
+      if isinstance(self.sl, _socklock_pool):
+         self.sl.close()
+      elif self.sl.s is not None:
          self.sl.s.close()
          self.sl.s = None
 
@@ -0,0 +1,567 @@
+"""
+pigpio_asyncio is an asyncio client for the pigpio daemon.
+
+It speaks the same socket protocol as the pigpio module, but with
+awaitable commands and notifications delivered through async
+iterators, so several tasks (a GPS logger, an IMU logger, a control
+loop) can share one event loop instead of each running its own
+polling thread.  Python 3.5 or later is required.
+
+Commands may be issued from any number of tasks at once.  They are
+written to the command socket as soon as they are made and their
+replies are matched up in order by a single reader task, so commands
+from different tasks are pipelined rather than queued behind each
+other's round trips.
+
+...
+import asyncio
+import pigpio
+import pigpio_asyncio
+
+async def main():
+   pi = await pigpio_asyncio.connect()
+
+   await pi.set_mode(17, pigpio.OUTPUT)
+   await pi.write(17, 1)
+
+   async with await pi.edges(4, pigpio.EITHER_EDGE) as edges:
+      async for gpio, level, tick in edges:
+         print(gpio, level, tick)
+
+   await pi.stop()
+
+asyncio.get_event_loop().run_until_complete(main())
+...
+
+Constants, errors and the exceptions setting are shared with the
+pigpio module.
+"""
+
+import asyncio
+import collections
+import os
+import struct
+
+import pigpio
+
+_CMD = struct.Struct('IIII')
+_REPLY = struct.Struct('IIIi')
+_REPORT = struct.Struct('HHII')
+
+async def connect(host=os.getenv("PIGPIO_ADDR", 'localhost'),
+                  port=os.getenv("PIGPIO_PORT", 8888)):
+   """
+   Connects to the pigpio daemon and returns a pi.
+
+   host:= the host name of the Pi on which the pigpio daemon is
+          running, default localhost or PIGPIO_ADDR.
+   port:= the port number on which the pigpio daemon is listening,
+          default 8888 or PIGPIO_PORT.
+
+   Raises OSError if the daemon can't be reached.
+   """
+   if host == '':
+      host = 'localhost'
+   p = pi(host, int(port))
+   p._reader, p._writer = await asyncio.open_connection(host, p._port)
+   p._reply_task = asyncio.ensure_future(p._read_replies())
+   return p
+
+class _stream:
+   """
+   An async iterator of notifications, returned by [*edges*] and
+   [*events*].  It may be used as an async context manager, which
+   closes it on exit.
+   """
+
+   def __init__(self, notify, bits, edge=None):
+      self._notify = notify
+      self.bits = bits
+      self.edge = edge
+      self._queue = asyncio.Queue()
+      self._closed = False
+
+   def __aiter__(self):
+      return self
+
+   async def __anext__(self):
+      item = await self._queue.get()
+      if item is None:
+         raise StopAsyncIteration
+      return item
+
+   async def __aenter__(self):
+      return self
+
+   async def __aexit__(self, exc_type, exc_value, traceback):
+      await self.aclose()
+
+   async def aclose(self):
+      """Stops the notifications and ends the iteration."""
+      if not self._closed:
+         self._closed = True
+         self._queue.put_nowait(None)
+         await self._notify.remove(self)
+
+class _bb_serial_reader:
+   """
+   An async iterator of chunks of bit bang serial data, returned by
+   [*bb_serial_reader*].  It polls the daemon, sleeping between polls
+   while no data is waiting, like pigpio.pi.bb_serial_reader.
+   """
+
+   def __init__(self, pi, user_gpio, buffer, poll_interval,
+                min_interval=0.001, max_interval=0.1):
+      self._pi = pi
+      self.gpio = user_gpio
+      if buffer is None:
+         buffer = bytearray(8192)
+      self.buffer = buffer
+      self._view = memoryview(buffer)
+      self.poll_interval = poll_interval
+      self.min_interval = min_interval
+      self.max_interval = max_interval
+      self._interval = min_interval
+      self.closed = False
+
+   async def readinto(self, buf):
+      """
+      Reads whatever data is waiting, up to the size of buf, into
+      buf without waiting.  Returns the number of bytes read.
+      """
+      view = memoryview(buf)
+      res, ext = await self._pi._send(
+         _CMD.pack(pigpio._PI_CMD_SLR, self.gpio, len(view), 0))
+      res = pigpio.u2i(res)
+      if res > 0:
+         view[:res] = ext
+      return pigpio._u2i(res)
+
+   async def read(self, timeout=None):
+      """
+      Waits for data and returns it as a memoryview of the reader's
+      buffer, valid until the next read.  The view is empty if
+      timeout seconds pass (or the reader is closed) first.
+      """
+      loop = asyncio.get_event_loop()
+      if timeout is not None:
+         deadline = loop.time() + timeout
+      while not self.closed:
+         count = await self.readinto(self._view)
+         if count > 0:
+            self._interval = self.min_interval
+            return self._view[:count]
+
+         if self.poll_interval is not None:
+            interval = self.poll_interval
+         else:
+            interval = self._interval
+            self._interval = min(self._interval * 2, self.max_interval)
+         if timeout is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+               break
+            interval = min(interval, remaining)
+         await asyncio.sleep(interval)
+      return self._view[:0]
+
+   def __aiter__(self):
+      return self
+
+   async def __anext__(self):
+      data = await self.read()
+      if self.closed:
+         raise StopAsyncIteration
+      return data
+
+   def close(self):
+      """
+      Ends the iteration.  The GPIO is left open; close it with
+      [*bb_serial_read_close*].
+      """
+      self.closed = True
+
+class _notifications:
+   """The notification socket, shared by all the streams of a pi."""
+
+   def __init__(self, control):
+      self.control = control
+      self.edges = []
+      self.events = []
+      self.monitor = 0
+      self.event_bits = 0
+      self.handle = None
+      self._task = None
+
+   async def open(self, host, port):
+      self._reader, self._writer = await asyncio.open_connection(host, port)
+      self.last_level = await self._command(pigpio._PI_CMD_BR1)
+      self.handle = pigpio._u2i(await self._command(pigpio._PI_CMD_NOIB))
+      self._task = asyncio.ensure_future(self._run())
+
+   async def _command(self, cmd):
+      self._writer.write(_CMD.pack(cmd, 0, 0, 0))
+      reply = await self._reader.readexactly(_REPLY.size)
+      return _REPLY.unpack(reply)[3] & 0xffffffff
+
+   async def add(self, stream):
+      if stream.edge is None:
+         self.events.append(stream)
+      else:
+         self.edges.append(stream)
+      await self._update()
+
+   async def remove(self, stream):
+      if stream in self.edges:
+         self.edges.remove(stream)
+      if stream in self.events:
+         self.events.remove(stream)
+      await self._update()
+
+   async def _update(self):
+      monitor = 0
+      for s in self.edges:
+         monitor |= s.bits
+      if monitor != self.monitor:
+         self.monitor = monitor
+         await self.control.command(pigpio._PI_CMD_NB, self.handle, monitor)
+      event_bits = 0
+      for s in self.events:
+         event_bits |= s.bits
+      if event_bits != self.event_bits:
+         self.event_bits = event_bits
+         await self.control.command(
+            pigpio._PI_CMD_EVM, self.handle, event_bits)
+
+   async def _run(self):
+      last_level = self.last_level
+      buf = bytearray()
+      try:
+         while True:
+            data = await self._reader.read(4096)
+            if not data:
+               break
+            buf.extend(data)
+            # Reports are 12 bytes each, keep any partial one for later.
+            whole = len(buf) - len(buf) % _REPORT.size
+            reports = bytes(buf[:whole])
+            del buf[:whole]
+            for seq, flags, tick, level in _REPORT.iter_unpack(reports):
+               if flags == 0:
+                  changed = level ^ last_level
+                  last_level = level
+                  for s in self.edges:
+                     bit = s.bits & changed
+                     if bit:
+                        gpio = bit.bit_length() - 1
+                        new_level = 1 if level & bit else 0
+                        if s.edge ^ new_level:
+                           s._queue.put_nowait((gpio, new_level, tick))
+               elif flags & pigpio.NTFY_FLAGS_WDOG:
+                  gpio = flags & pigpio.NTFY_FLAGS_GPIO
+                  for s in self.edges:
+                     if s.bits & (1 << gpio):
+                        s._queue.put_nowait((gpio, pigpio.TIMEOUT, tick))
+               elif flags & pigpio.NTFY_FLAGS_EVENT:
+                  event = flags & pigpio.NTFY_FLAGS_GPIO
+                  for s in self.events:
+                     if s.bits & (1 << event):
+                        s._queue.put_nowait((event, tick))
+      except asyncio.IncompleteReadError:
+         pass
+      # The daemon has gone, end every stream.
+      for s in self.edges + self.events:
+         s._queue.put_nowait(None)
+
+   async def close(self):
+      if self.handle is not None:
+         self._writer.write(_CMD.pack(pigpio._PI_CMD_NC, self.handle, 0, 0))
+      self._writer.close()
+      if self._task is not None:
+         await self._task
+
+class pi():
+   """
+   An asyncio connection to the pigpio daemon, made by [*connect*].
+   """
+
+   def __init__(self, host, port):
+      self._host = host
+      self._port = port
+      self._reader = None
+      self._writer = None
+      self._reply_task = None
+      self._pending = collections.deque()
+      self._notify = None
+      self._notify_lock = asyncio.Lock()
+      self.connected = True
+
+   async def _read_replies(self):
+      """Resolves pending commands with their replies, in order."""
+      try:
+         while True:
+            reply = await self._reader.readexactly(_REPLY.size)
+            cmd, p1, p2, res = _REPLY.unpack(reply)
+            ext = None
+            if cmd in pigpio._EXT_REPLY_CMDS and res > 0:
+               ext = await self._reader.readexactly(res)
+            future = self._pending.popleft()
+            if not future.done():
+               future.set_result((res & 0xffffffff, ext))
+      except (asyncio.IncompleteReadError, ConnectionError) as e:
+         self.connected = False
+         while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+               future.set_exception(pigpio.error("pigpio connection closed"))
+
+   async def _send(self, data):
+      """
+      Sends a command and returns (result, extension data) from its
+      reply.  The command is queued for its reply before anything is
+      awaited, so replies stay in the order the commands were sent.
+      """
+      if not self.connected:
+         raise pigpio.error("pigpio connection closed")
+      future = asyncio.get_event_loop().create_future()
+      self._pending.append(future)
+      self._writer.write(data)
+      try:
+         # Wait for the socket to take the command if a burst of
+         # commands has filled the write buffer.
+         await self._writer.drain()
+      except ConnectionError:
+         future.cancel()
+         raise pigpio.error("pigpio connection closed")
+      return await future
+
+   async def command(self, cmd, p1=0, p2=0):
+      """
+      Runs a pigpio command and returns its unsigned 32 bit result.
+      """
+      res, ext = await self._send(_CMD.pack(cmd, p1, p2, 0))
+      return res
+
+   async def command_ext(self, cmd, p1, p2, extents):
+      """
+      Runs an extended pigpio command.
+
+      extents:= a list of bytes-like objects or strings sent after
+                the command.
+
+      Returns a tuple of the command's unsigned 32 bit result and
+      any extension data in its reply (None if there was none).
+      """
+      ext = bytearray()
+      for x in extents:
+         if isinstance(x, str):
+            ext.extend(x.encode('latin-1'))
+         else:
+            ext.extend(x)
+      return await self._send(_CMD.pack(cmd, p1, p2, len(ext)) + ext)
+
+   async def set_mode(self, gpio, mode):
+      """Sets the GPIO mode, see pigpio.pi.set_mode."""
+      return pigpio._u2i(
+         await self.command(pigpio._PI_CMD_MODES, gpio, mode))
+
+   async def get_mode(self, gpio):
+      """Returns the GPIO mode, see pigpio.pi.get_mode."""
+      return pigpio._u2i(await self.command(pigpio._PI_CMD_MODEG, gpio))
+
+   async def set_pull_up_down(self, gpio, pud):
+      """Sets the GPIO pull-up/down, see pigpio.pi.set_pull_up_down."""
+      return pigpio._u2i(await self.command(pigpio._PI_CMD_PUD, gpio, pud))
+
+   async def read(self, gpio):
+      """Returns the GPIO level."""
+      return pigpio._u2i(await self.command(pigpio._PI_CMD_READ, gpio))
+
+   async def write(self, gpio, level):
+      """Sets the GPIO level."""
+      return pigpio._u2i(
+         await self.command(pigpio._PI_CMD_WRITE, gpio, level))
+
+   async def set_PWM_dutycycle(self, user_gpio, dutycycle):
+      """Starts PWM on a GPIO, see pigpio.pi.set_PWM_dutycycle."""
+      return pigpio._u2i(await self.command(
+         pigpio._PI_CMD_PWM, user_gpio, int(dutycycle)))
+
+   async def set_servo_pulsewidth(self, user_gpio, pulsewidth):
+      """Starts servo pulses, see pigpio.pi.set_servo_pulsewidth."""
+      return pigpio._u2i(await self.command(
+         pigpio._PI_CMD_SERVO, user_gpio, int(pulsewidth)))
+
+   async def set_watchdog(self, user_gpio, wdog_timeout):
+      """Sets a watchdog on a GPIO, see pigpio.pi.set_watchdog."""
+      return pigpio._u2i(await self.command(
+         pigpio._PI_CMD_WDOG, user_gpio, int(wdog_timeout)))
+
+   async def gpio_trigger(self, user_gpio, pulse_len=10, level=1):
+      """Sends a trigger pulse to a GPIO, see pigpio.pi.gpio_trigger."""
+      res, ext = await self.command_ext(
+         pigpio._PI_CMD_TRIG, user_gpio, pulse_len, [struct.pack("I", level)])
+      return pigpio._u2i(res)
+
+   async def read_bank_1(self):
+      """Returns the levels of GPIO 0-31."""
+      return await self.command(pigpio._PI_CMD_BR1)
+
+   async def get_current_tick(self):
+      """Returns the current system tick."""
+      return await self.command(pigpio._PI_CMD_TICK)
+
+   async def bb_serial_read_open(self, user_gpio, baud, bb_bits=8):
+      """
+      Opens a GPIO for bit bang reading of serial data, see
+      pigpio.pi.bb_serial_read_open.
+      """
+      res, ext = await self.command_ext(
+         pigpio._PI_CMD_SLRO, user_gpio, baud, [struct.pack("I", bb_bits)])
+      return pigpio._u2i(res)
+
+   async def bb_serial_read(self, user_gpio):
+      """
+      Returns (count, data) from the bit bang serial cyclic buffer,
+      see pigpio.pi.bb_serial_read.
+      """
+      res, ext = await self._send(
+         _CMD.pack(pigpio._PI_CMD_SLR, user_gpio, 10000, 0))
+      res = pigpio.u2i(res)
+      if res > 0:
+         return res, bytearray(ext)
+      return res, ""
+
+   def bb_serial_reader(self, user_gpio, buffer=None, poll_interval=None,
+                        max_interval=0.1):
+      """
+      Returns an async iterator of chunks of data from a GPIO opened
+      for bit bang serial reading, see pigpio.pi.bb_serial_reader.
+      Each chunk is a memoryview of the buffer and is only valid
+      until the next chunk is read.
+
+      ...
+      await pi.bb_serial_read_open(4, 9600)
+      async for data in pi.bb_serial_reader(4):
+         print(bytes(data))
+      ...
+      """
+      return _bb_serial_reader(
+         self, user_gpio, buffer, poll_interval, max_interval=max_interval)
+
+   async def bb_serial_read_close(self, user_gpio):
+      """Closes a GPIO for bit bang reading of serial data."""
+      return pigpio._u2i(await self.command(pigpio._PI_CMD_SLRC, user_gpio))
+
+   async def _notifications(self):
+      async with self._notify_lock:
+         if self._notify is None:
+            notify = _notifications(self)
+            await notify.open(self._host, self._port)
+            self._notify = notify
+      return self._notify
+
+   async def edges(self, user_gpio, edge=pigpio.RISING_EDGE):
+      """
+      Returns an async iterator of (GPIO, level, tick) for the
+      edges on a GPIO, as passed to a pigpio.pi.callback function.
+      Watchdog timeouts give a level of pigpio.TIMEOUT.
+
+      user_gpio:= 0-31.
+           edge:= EITHER_EDGE, RISING_EDGE (default), or FALLING_EDGE.
+
+      Edges are queued until they are read.  Close the iterator
+      (or use it in an async with) to stop the notifications.
+
+      ...
+      async with await pi.edges(4, pigpio.EITHER_EDGE) as edges:
+         async for gpio, level, tick in edges:
+            print(gpio, level, tick)
+      ...
+      """
+      notify = await self._notifications()
+      stream = _stream(notify, 1 << user_gpio, edge)
+      await notify.add(stream)
+      return stream
+
+   async def events(self, event):
+      """
+      Returns an async iterator of (event, tick) for an event, as
+      passed to a pigpio.pi.event_callback function.
+
+      event:= 0-31.
+      """
+      notify = await self._notifications()
+      stream = _stream(notify, 1 << event)
+      await notify.add(stream)
+      return stream
+
+   async def _wait(self, stream, wait_timeout):
+      """
+      Returns the first item of stream, or None if none arrives
+      within wait_timeout seconds, and closes the stream.
+      """
+      try:
+         return await asyncio.wait_for(stream.__anext__(), wait_timeout)
+      except (asyncio.TimeoutError, StopAsyncIteration):
+         return None
+      finally:
+         await stream.aclose()
+
+   async def wait_for_edge(self, user_gpio, edge=pigpio.RISING_EDGE,
+                           wait_timeout=60.0):
+      """
+      Waits for an edge on a GPIO, see pigpio.pi.wait_for_edge.
+
+      Returns True if the edge arrived within wait_timeout seconds,
+      otherwise False.
+      """
+      return await self.wait_for_edge_tick(
+         user_gpio, edge, wait_timeout) is not None
+
+   async def wait_for_edge_tick(self, user_gpio, edge=pigpio.RISING_EDGE,
+                                wait_timeout=60.0):
+      """
+      Waits for an edge on a GPIO, see pigpio.pi.wait_for_edge_tick.
+
+      Returns (level, tick) of the edge, or None if none arrived
+      within wait_timeout seconds.
+      """
+      item = await self._wait(
+         await self.edges(user_gpio, edge), wait_timeout)
+      return None if item is None else item[1:]
+
+   async def wait_for_event(self, event, wait_timeout=60.0):
+      """
+      Waits for an event, see pigpio.pi.wait_for_event.
+
+      Returns True if the event was signalled within wait_timeout
+      seconds, otherwise False.
+      """
+      return await self.wait_for_event_tick(
+         event, wait_timeout) is not None
+
+   async def wait_for_event_tick(self, event, wait_timeout=60.0):
+      """
+      Waits for an event, see pigpio.pi.wait_for_event_tick.
+
+      Returns the tick of the event, or None if it wasn't signalled
+      within wait_timeout seconds.
+      """
+      item = await self._wait(await self.events(event), wait_timeout)
+      return None if item is None else item[1]
+
+   async def event_trigger(self, event):
+      """Signals an event, see pigpio.pi.event_trigger."""
+      return pigpio._u2i(await self.command(pigpio._PI_CMD_EVT, event))
+
+   async def stop(self):
+      """Closes the notifications and the connection to the daemon."""
+      if self._notify is not None:
+         await self._notify.close()
+         self._notify = None
+      if self._writer is not None:
+         self._writer.close()
+         await self._reply_task
+         self._writer = None
+      self.connected = False
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
+import sys
+
 from distutils.core import setup
 
 setup(name='pigpio',
@@ -13,7 +15,8 @@ setup(name='pigpio',
       long_description='Raspberry Pi Python module to access the pigpio daemon',
       download_url='http://abyz.me.uk/rpi/pigpio/pigpio.zip',
       license='unlicense.org',
-      py_modules=['pigpio'],
+      py_modules=['pigpio'] +
+         (['pigpio_asyncio'] if sys.version_info >= (3, 5) else []),
       keywords=['raspberrypi', 'gpio',],
       classifiers=[
          "Programming Language :: Python :: 2",
@@ -0,0 +1,377 @@
+"""
+Tests for the pigpio module against fake_pigpiod.
+
+python -m pytest test_pigpio.py
+"""
+
+import threading
+import time
+
+import pytest
+
+import pigpio
+import fake_pigpiod
+
+# The edge and event waits used to poll every 50 ms.
+OLD_POLL = 0.05
+
+@pytest.fixture
+def daemon():
+   d = fake_pigpiod.fake_pigpiod()
+   d.start()
+   yield d
+   d.stop()
+
+@pytest.fixture
+def pi(daemon):
+   p = pigpio.pi('localhost', daemon.port)
+   yield p
+   p.stop()
+
+def _wake_latencies(pi, wait, trigger, count=20):
+   """
+   Seconds from trigger() being called on another thread to wait()
+   returning, for each of count waits.  Returns the latencies and
+   what each wait returned.
+   """
+   latencies = []
+   results = []
+   for i in range(count):
+      triggered = []
+      def fire():
+         time.sleep(0.01)
+         triggered.append(time.time())
+         trigger()
+      t = threading.Thread(target=fire)
+      t.start()
+      results.append(wait())
+      latencies.append(time.time() - triggered[0])
+      t.join()
+   return sorted(latencies), results
+
+def test_wait_for_event_wakes_at_once(daemon, pi):
+   other = pigpio.pi('localhost', daemon.port)
+   try:
+      latencies, results = _wake_latencies(
+         pi, lambda: pi.wait_for_event(7, 1.0),
+         lambda: other.event_trigger(7))
+   finally:
+      other.stop()
+   assert results == [True] * len(results)
+   assert latencies[len(latencies) // 2] < OLD_POLL / 10
+   assert latencies[-1] < OLD_POLL
+
+def test_wait_for_edge_wakes_at_once(daemon, pi):
+   other = pigpio.pi('localhost', daemon.port)
+   levels = []
+   def toggle():
+      levels.append(0 if levels and levels[-1] else 1)
+      other.write(4, levels[-1])
+   try:
+      latencies, results = _wake_latencies(
+         pi, lambda: pi.wait_for_edge(4, pigpio.EITHER_EDGE, 1.0), toggle)
+   finally:
+      other.stop()
+   assert results == [True] * len(results)
+   assert latencies[len(latencies) // 2] < OLD_POLL / 10
+   assert latencies[-1] < OLD_POLL
+
+def test_waits_time_out_false(pi):
+   start = time.time()
+   assert pi.wait_for_edge(4, pigpio.RISING_EDGE, 0.1) is False
+   assert pi.wait_for_event(7, 0.1) is False
+   assert 0.2 <= time.time() - start < 1.0
+   assert pi.wait_for_edge_tick(4, pigpio.RISING_EDGE, 0.1) is None
+   assert pi.wait_for_event_tick(7, 0.1) is None
+
+def test_wait_ticks(daemon, pi):
+   other = pigpio.pi('localhost', daemon.port)
+   try:
+      timer = threading.Timer(0.05, other.write, (4, 1))
+      timer.start()
+      before = pi.get_current_tick()
+      level, tick = pi.wait_for_edge_tick(4, pigpio.RISING_EDGE, 1.0)
+      timer.join()
+      assert level == 1
+      assert 0 < pigpio.tickDiff(before, tick) < 1000000
+
+      timer = threading.Timer(0.05, other.event_trigger, (7,))
+      timer.start()
+      before = pi.get_current_tick()
+      tick = pi.wait_for_event_tick(7, 1.0)
+      timer.join()
+      assert tick is not None
+      assert 0 < pigpio.tickDiff(before, tick) < 1000000
+   finally:
+      other.stop()
+
+def test_wait_for_either_edge_gives_its_level(daemon, pi):
+   other = pigpio.pi('localhost', daemon.port)
+   try:
+      for level in (1, 0, 1):
+         timer = threading.Timer(0.02, other.write, (4, level))
+         timer.start()
+         before = pi.get_current_tick()
+         edge = pi.wait_for_edge_tick(4, pigpio.EITHER_EDGE, 1.0)
+         timer.join()
+         assert edge is not None
+         assert edge[0] == level
+         assert 0 < pigpio.tickDiff(before, edge[1]) < 1000000
+   finally:
+      other.stop()
+
+def test_batch_results(pi):
+   with pi.batch() as b:
+      b.set_mode(4, pigpio.OUTPUT)
+      b.write(4, 1)
+      b.read(4)
+      b.get_mode(4)
+      b.read_bank_1()
+      b.get_pigpio_version()
+      b.set_PWM_range(18, 1000)
+   assert b.results == [0, 0, 1, pigpio.OUTPUT, 1 << 4, 79, 1000]
+   # the commands really ran
+   assert pi.read(4) == 1
+
+def test_batch_error_in_the_middle(pi):
+   b = pi.batch()
+   b.write(4, 1)
+   b.write(99, 1)
+   b.read(4)
+   with pytest.raises(pigpio.error) as e:
+      b.run()
+   assert e.value.value == pigpio.error_text(pigpio.PI_BAD_GPIO)
+   # every reply was still read, and the commands after it ran
+   assert b.results == [0, pigpio.PI_BAD_GPIO, 1]
+   assert pi.read(4) == 1
+
+def test_batch_without_exceptions(pi):
+   pigpio.exceptions = False
+   try:
+      with pi.batch() as b:
+         b.write(99, 1)
+         b.read(4)
+   finally:
+      pigpio.exceptions = True
+   assert b.results == [pigpio.PI_BAD_GPIO, 0]
+
+def test_batch_rejects_other_methods(pi):
+   b = pi.batch()
+   b.write(4, 1)
+   start = time.time()
+   for name in ("callback", "wait_for_edge", "stop", "bb_serial_read",
+                "batch", "no_such_method"):
+      with pytest.raises(pigpio.error):
+         getattr(b, name)
+   assert time.time() - start < 0.1
+   assert pi._notify.callbacks == []
+   assert pi.connected
+   # the queued command is unaffected
+   assert b.run() == [0]
+   assert pi.read(4) == 1
+
+def test_batch_bad_arguments_queue_nothing(pi):
+   b = pi.batch()
+   with pytest.raises(TypeError):
+      b.write(4)
+   b.read(4)
+   assert b.run() == [0]
+
+GPS_RX = 23
+
+@pytest.fixture
+def serial_pi():
+   d = fake_pigpiod.fake_pigpiod(serial_speed=None)
+   d.start()
+   p = pigpio.pi('localhost', d.port)
+   yield p
+   p.stop()
+   d.stop()
+
+def test_serial_reader_reads_the_capture(serial_pi):
+   capture = fake_pigpiod.synthetic_capture()
+   serial_pi.bb_serial_read_open(GPS_RX, 9600)
+   reader = serial_pi.bb_serial_reader(GPS_RX, buffer=bytearray(1000))
+   data = bytearray()
+   while len(data) < 5000:
+      chunk = reader.read(1.0)
+      assert len(chunk) > 0
+      data += chunk
+   assert data == capture[:len(data)]
+   assert reader.bytes == len(data)
+
+   buf = bytearray(10)
+   assert reader.readinto(buf) == 10
+   assert buf == capture[len(data):len(data) + 10]
+
+def test_serial_reader_raises_errors(pi):
+   reader = pi.bb_serial_reader(GPS_RX)
+   start = time.time()
+   with pytest.raises(pigpio.error) as e:
+      reader.read(1.0)
+   assert e.value.value == pigpio.error_text(pigpio.PI_NOT_SERIAL_GPIO)
+   with pytest.raises(pigpio.error):
+      reader.readinto(bytearray(10))
+   assert time.time() - start < 0.5
+
+def test_serial_reader_returns_errors_without_exceptions(pi):
+   reader = pi.bb_serial_reader(GPS_RX)
+   pigpio.exceptions = False
+   try:
+      start = time.time()
+      assert reader.read(1.0) == pigpio.PI_NOT_SERIAL_GPIO
+      assert reader.readinto(bytearray(10)) == pigpio.PI_NOT_SERIAL_GPIO
+      assert next(reader) == pigpio.PI_NOT_SERIAL_GPIO
+      assert time.time() - start < 0.5
+   finally:
+      pigpio.exceptions = True
+   assert reader.empty_polls == 0
+
+def test_error_text():
+   assert pigpio.error_text(pigpio.PI_BAD_GPIO) == "GPIO not 0-53"
+   assert pigpio.error_text(pigpio.PI_NOT_SERIAL_GPIO) == \
+      "no bit bang serial read in progress on GPIO"
+   for errnum, text in pigpio._errors:
+      assert pigpio.error_text(errnum) == text
+   assert pigpio.error_text(-12345) == "unknown error (-12345)"
+   assert pigpio.error_text(0) == "unknown error (0)"
+
+def test_command_errors_carry_their_text(pi):
+   with pytest.raises(pigpio.error) as e:
+      pi.write(99, 1)
+   assert e.value.value == pigpio.error_text(pigpio.PI_BAD_GPIO)
+
+def _until(condition, timeout=1.0):
+   """Waits for condition() to hold, for notifications to arrive."""
+   deadline = time.time() + timeout
+   while not condition() and time.time() < deadline:
+      time.sleep(0.005)
+   return condition()
+
+def test_callbacks_dispatch_by_gpio(pi):
+   either = []
+   rising = []
+   falling = []
+   pi.callback(4, pigpio.EITHER_EDGE, lambda g, l, t: either.append((g, l)))
+   pi.callback(4, pigpio.RISING_EDGE, lambda g, l, t: rising.append((g, l)))
+   pi.callback(5, pigpio.FALLING_EDGE, lambda g, l, t: falling.append((g, l)))
+   tally = pi.callback(6)
+   for gpio, level in ((4, 1), (5, 1), (4, 0), (5, 0), (6, 1), (6, 0), (6, 1)):
+      pi.write(gpio, level)
+   assert _until(lambda: len(either) == 2 and falling and tally.tally() == 2)
+   time.sleep(0.05)
+   assert either == [(4, 1), (4, 0)]
+   assert rising == [(4, 1)]
+   assert falling == [(5, 0)]
+   assert tally.tally() == 2
+
+def test_event_callbacks_dispatch_by_event(pi):
+   seen = []
+   pi.event_callback(3, lambda e, t: seen.append(e))
+   pi.event_callback(7, lambda e, t: seen.append(e))
+   pi.event_trigger(7)
+   pi.event_trigger(2)
+   pi.event_trigger(3)
+   assert _until(lambda: len(seen) == 2)
+   time.sleep(0.05)
+   assert seen == [7, 3]
+
+def test_callbacks_keep_up_with_a_flood(pi):
+   # Far more reports than one recv holds, and not a whole number of
+   # reports per recv, so some are split across recvs.
+   levels = []
+   ticks = []
+   def edge(gpio, level, tick):
+      levels.append(level)
+      ticks.append(tick)
+   pi.callback(4, pigpio.EITHER_EDGE, edge)
+   count = 2001
+   with pi.batch() as b:
+      for i in range(count):
+         b.write(4, (i + 1) & 1)
+   assert _until(lambda: len(levels) == count, 5.0)
+   assert levels == [(i + 1) & 1 for i in range(count)]
+   assert all(pigpio.tickDiff(a, b) < 1000000 for a, b in zip(ticks, ticks[1:]))
+
+def test_cancelled_callbacks_stop(pi):
+   seen = []
+   cb = pi.callback(4, pigpio.EITHER_EDGE, lambda g, l, t: seen.append(l))
+   other = pi.callback(5, pigpio.EITHER_EDGE)
+   pi.write(4, 1)
+   assert _until(lambda: seen == [1])
+   cb.cancel()
+   assert pi._notify.gpio_callbacks[4] == ()
+   assert pi._notify.monitor == 1 << 5
+   pi.write(4, 0)
+   pi.write(5, 1)
+   assert _until(lambda: other.tally() == 1)
+   assert seen == [1]
+
+def _pool_threads(p, threads, count):
+   """
+   Runs count PRS commands on each of threads threads, returning the
+   replies each thread got and the ranges it sent.  PRS replies with
+   the range it was given, so a reply meant for another thread shows.
+   """
+   sent = [[1000 * (t + 1) + i for i in range(count)] for t in range(threads)]
+   got = [[] for t in range(threads)]
+   def run(t):
+      for r in sent[t]:
+         got[t].append(p.set_PWM_range(18, r))
+   workers = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+   for w in workers:
+      w.start()
+   for w in workers:
+      w.join()
+   return got, sent
+
+def test_pool_gives_each_thread_its_own_socket(daemon):
+   p = pigpio.pi('localhost', daemon.port, command_sockets=3,
+                 checkout=pigpio.CHECKOUT_THREAD)
+   try:
+      before = list(p.sl.acquires)
+      got, sent = _pool_threads(p, 3, 100)
+      assert got == sent
+      # new threads are given the sockets in turn
+      assert [a - b for a, b in zip(p.sl.acquires, before)] == [100] * 3
+      stats = p.get_command_stats()
+      assert stats['sockets'] == 3
+      assert stats['acquires'] == sum(p.sl.acquires)
+   finally:
+      p.stop()
+   assert p.sl.socks == []
+
+def test_pool_threads_share_sockets_when_outnumbered():
+   d = fake_pigpiod.fake_pigpiod(latency=0.001)
+   d.start()
+   p = pigpio.pi('localhost', d.port, command_sockets=2,
+                 checkout=pigpio.CHECKOUT_THREAD)
+   try:
+      got, sent = _pool_threads(p, 4, 20)
+      assert got == sent
+      stats = p.get_command_stats()
+      assert stats['contended'] > 0
+      assert 0 < stats['max_wait'] <= stats['wait_time']
+   finally:
+      p.stop()
+      d.stop()
+
+def test_pool_round_robin(daemon):
+   p = pigpio.pi('localhost', daemon.port, command_sockets=2,
+                 checkout=pigpio.CHECKOUT_ROUND_ROBIN)
+   try:
+      before = sum(p.sl.acquires)
+      got, sent = _pool_threads(p, 4, 100)
+      assert got == sent
+      assert sum(p.sl.acquires) - before == 400
+      assert all(a > 0 for a in p.sl.acquires)
+      # a lone thread still goes round the sockets
+      before = list(p.sl.acquires)
+      for i in range(10):
+         p.read(4)
+      assert [a - b for a, b in zip(p.sl.acquires, before)] == [5, 5]
+   finally:
+      p.stop()
+
+def test_no_pool_no_stats(pi):
+   assert pi.get_command_stats() is None
@@ -0,0 +1,163 @@
+"""
+Tests for pigpio_asyncio against fake_pigpiod.
+
+python -m pytest test_pigpio_asyncio.py
+"""
+
+import asyncio
+import struct
+
+import pytest
+
+import pigpio
+import pigpio_asyncio
+import fake_pigpiod
+
+GPS_RX = 23
+
+@pytest.fixture
+def daemon():
+   d = fake_pigpiod.fake_pigpiod(latency=0.001, serial_speed=None)
+   d.start()
+   yield d
+   d.stop()
+
+def run(test, port):
+   """Runs test(pi) on a new event loop, connected to port."""
+   async def main():
+      pi = await pigpio_asyncio.connect('localhost', port)
+      try:
+         return await test(pi)
+      finally:
+         await pi.stop()
+   return asyncio.run(main())
+
+def test_pipelined_commands_keep_their_order(daemon):
+   async def test(pi):
+      # PRS replies with the range it was given, so every reply can
+      # be matched to its command.
+      ranges = [25 + i for i in range(500)]
+      results = await asyncio.gather(
+         *[pi.command(pigpio._PI_CMD_PRS, 4, r) for r in ranges])
+      assert results == ranges
+
+      await asyncio.gather(*[pi.write(g, g & 1) for g in range(10)])
+      levels = await asyncio.gather(*[pi.read(g) for g in range(10)])
+      assert levels == [g & 1 for g in range(10)]
+
+   run(test, daemon.port)
+
+def test_command_errors_raise(daemon):
+   async def test(pi):
+      with pytest.raises(pigpio.error):
+         await pi.write(99, 1)
+      # and the replies after it still line up
+      assert await pi.read(4) == 0
+
+   run(test, daemon.port)
+
+def test_ext_replies(daemon):
+   capture = fake_pigpiod.synthetic_capture()
+
+   async def test(pi):
+      assert await pi.bb_serial_read_open(GPS_RX, 9600) == 0
+      reader = pi.bb_serial_reader(GPS_RX)
+      first = bytearray(100)
+      second = bytearray(100)
+      # ext replies interleaved with plain ones
+      counts = await asyncio.gather(
+         reader.readinto(first), pi.read(4), reader.readinto(second))
+      assert counts == [100, 0, 100]
+      assert first + second == capture[:200]
+
+      count, data = await pi.bb_serial_read(GPS_RX)
+      assert count > 0 and len(data) == count
+      assert await pi.bb_serial_read_close(GPS_RX) == 0
+
+      res, ext = await pi.command_ext(
+         pigpio._PI_CMD_TRIG, 4, 10, [struct.pack("I", 1)])
+      assert (res, ext) == (0, None)
+
+   run(test, daemon.port)
+
+def test_edge_stream(daemon):
+   async def test(pi):
+      async with await pi.edges(4, pigpio.EITHER_EDGE) as edges:
+         rising = await pi.edges(4, pigpio.RISING_EDGE)
+         await pi.write(4, 1)
+         await pi.write(4, 0)
+         await pi.write(4, 1)
+         levels = [(await edges.__anext__())[:2] for i in range(3)]
+         assert levels == [(4, 1), (4, 0), (4, 1)]
+         assert (await rising.__anext__())[:2] == (4, 1)
+         assert (await rising.__anext__())[:2] == (4, 1)
+         await rising.aclose()
+      # closed streams end their iteration
+      assert [e async for e in edges] == []
+
+   run(test, daemon.port)
+
+def test_event_stream(daemon):
+   async def test(pi):
+      async with await pi.events(7) as events:
+         await pi.event_trigger(6)
+         await pi.event_trigger(7)
+         event, tick = await asyncio.wait_for(events.__anext__(), 1.0)
+         assert event == 7
+
+   run(test, daemon.port)
+
+def test_wait_for_edge_times_out(daemon):
+   async def test(pi):
+      loop = asyncio.get_event_loop()
+      start = loop.time()
+      assert await pi.wait_for_edge(4, pigpio.RISING_EDGE, 0.1) is False
+      assert 0.1 <= loop.time() - start < 1.0
+      # and the stream it opened is closed again
+      assert pi._notify.edges == []
+
+   run(test, daemon.port)
+
+def test_waits_return_booleans_and_ticks(daemon):
+   async def test(pi):
+      def later(command, *args):
+         async def send():
+            await asyncio.sleep(0.05)
+            await command(*args)
+         asyncio.ensure_future(send())
+
+      later(pi.event_trigger, 7)
+      assert await pi.wait_for_event(7, 1.0) is True
+      later(pi.write, 4, 1)
+      assert await pi.wait_for_edge(4, pigpio.RISING_EDGE, 1.0) is True
+
+      later(pi.event_trigger, 7)
+      assert isinstance(await pi.wait_for_event_tick(7, 1.0), int)
+      later(pi.write, 4, 0)
+      level, tick = await pi.wait_for_edge_tick(4, pigpio.EITHER_EDGE, 1.0)
+      assert level == 0 and isinstance(tick, int)
+      assert await pi.wait_for_edge_tick(4, pigpio.FALLING_EDGE, 0.1) is None
+      assert await pi.wait_for_event_tick(7, 0.1) is None
+
+   run(test, daemon.port)
+
+def test_connection_loss():
+   process, port = fake_pigpiod.spawn(latency=0.2)
+
+   async def test(pi):
+      edges = await pi.edges(4)
+      pending = asyncio.ensure_future(pi.read(4))
+      await asyncio.sleep(0.05)
+      process.terminate()
+      with pytest.raises(pigpio.error):
+         await pending
+      assert [e async for e in edges] == []
+      assert not pi.connected
+      with pytest.raises(pigpio.error):
+         await pi.read(4)
+
+   try:
+      run(test, port)
+   finally:
+      process.terminate()
+      process.join()